@@ -1,4 +1,11 @@
 from .main import API, APIRequest, APIResult, APIResults, APIQuery
-from .main import PLACES, GENDERS, STATES
+from .columns import APIColumns
+from .main import PLACES, GENDERS
 from .main import CAUSES
-from .main import BEGIN, TODAY, ONE_DAY
\ No newline at end of file
+from .main import BEGIN, TODAY, ONE_DAY, BACKFILL_DAYS
+
+def __getattr__(name: str):
+    ## `STATES` is read on first access
+    if name == 'STATES':
+        return API.STATES
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,183 @@
+## Standard Library
+from array import array
+import functools
+import datetime
+import operator
+
+## Local
+from api_constants import CAUSES, PLACES
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    """ The `numpy` module, imported on first use (it costs more than the rest of `import api`).
+        None if it is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class APIColumns(object):
+    """ Columnar storage of results: one typed `array` per field.
+
+        Dimensions are stored as small integer codes (date as an ordinal,
+        age bracket, gender and a bitmask of places) and each cause count
+        in its own column, so parsing a response appends plain integers and
+        summing results is done column by column. Slicing returns views
+        (`memoryview`) over the same buffers, without copying.
+    """
+
+    __slots__ = ('columns',)
+
+    ## Codes
+    AGE_NONE = -1 ## 'N/I'
+    AGE_ALL = -2 ## no age split (`age=False`)
+    GENDER_CODES = {None: 0, 'M': 1, 'F': 2}
+    GENDER_NAMES = {code: gender for gender, code in GENDER_CODES.items()}
+    PLACE_NAMES = tuple(sorted(PLACES))
+    PLACE_BITS = {place: 1 << i for i, place in enumerate(PLACE_NAMES)}
+
+    TYPECODES = {
+        'id': 'q',
+        'date': 'l',
+        'age': 'h',
+        'gender': 'b',
+        'place': 'B',
+        **{cause: 'l' for cause in CAUSES},
+        }
+
+    COLUMNS = tuple(TYPECODES)
+
+    AGE_TABLE = {
+        '< 9': 0,
+        '10 - 19': 10,
+        '20 - 29': 20,
+        '30 - 39': 30,
+        '40 - 49': 40,
+        '50 - 59': 50,
+        '60 - 69': 60,
+        '70 - 79': 70,
+        '80 - 89': 80,
+        '90 - 99': 90,
+        '> 100': 100,
+        'N/I': AGE_NONE,
+        }
+
+    def __init__(self, columns: dict=None):
+        if columns is None:
+            self.columns = {name: array(typecode) for name, typecode in self.TYPECODES.items()}
+        else:
+            self.columns = columns
+
+    def __repr__(self):
+        return f"APIColumns(size={len(self)})"
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, key):
+        """ columns[name] -> column
+            columns[i] -> tuple of codes, in `COLUMNS` order
+            columns[i:j] -> APIColumns view (no copy)
+        """
+        if type(key) is str:
+            return self.columns[key]
+        elif type(key) is slice:
+            return APIColumns({name: memoryview(column)[key] for name, column in self.columns.items()})
+        else:
+            return tuple(self.columns[name][key] for name in self.COLUMNS)
+
+    def __add__(self, other):
+        """ Sums the causes of two aligned sets of results (same rows, same order).
+            Dimensions are taken from `self`.
+        """
+        if len(self) != len(other):
+            raise ValueError(f'Resultados desalinhados: {len(self)} != {len(other)}')
+        columns = {name: array(self.TYPECODES[name], self.columns[name]) for name in self.COLUMNS if name not in CAUSES}
+        np = load_numpy()
+        for cause in CAUSES:
+            if np is not None:
+                total = self.numpy(cause) + other.numpy(cause)
+                columns[cause] = array(self.TYPECODES[cause], total.tobytes())
+            else:
+                columns[cause] = array(self.TYPECODES[cause], map(operator.add, self.columns[cause], other.columns[cause]))
+        return APIColumns(columns)
+
+    def numpy(self, name: str):
+        """ Column `name` as a NumPy array sharing its buffer (requires `numpy`).
+        """
+        np = load_numpy()
+        if np is None:
+            raise ImportError('A biblioteca `numpy` não está instalada.')
+        column = self.columns[name]
+        return np.frombuffer(column, dtype=np.dtype(self.TYPECODES[name]))
+
+    @classmethod
+    def place_code(cls, places: list) -> int:
+        return sum(cls.PLACE_BITS[place] for place in places)
+
+    @classmethod
+    def place_name(cls, code: int) -> str:
+        return '&'.join(place for place in cls.PLACE_NAMES if code & cls.PLACE_BITS[place])
+
+    @classmethod
+    def age_code(cls, age) -> int:
+        if age is False:
+            return cls.AGE_ALL
+        elif age is None:
+            return cls.AGE_NONE
+        else:
+            return age
+
+    @classmethod
+    def age_value(cls, code: int):
+        if code == cls.AGE_ALL:
+            return False
+        elif code == cls.AGE_NONE:
+            return None
+        else:
+            return code
+
+    def append(self, id: int, date: int, age: int, gender: int, place: int, counts):
+        """ Appends one row of codes; `counts` follows `CAUSES` order.
+        """
+        columns = self.columns
+        columns['id'].append(id)
+        columns['date'].append(date)
+        columns['age'].append(age)
+        columns['gender'].append(gender)
+        columns['place'].append(place)
+        for cause, count in zip(CAUSES, counts):
+            columns[cause].append(count)
+
+    def parse_ages(self, chart: dict, id: int, date: datetime.date, gender: int, place: int):
+        """ Reads a `chart2`/`chart3` response: {age: {year: {cause: count}}}.
+            `date` gives the day and month; the year comes from the response.
+        """
+        for age, years in chart.items():
+            age = self.AGE_TABLE[age]
+            for year, counts in years.items():
+                try:
+                    day = datetime.date(int(year), date.month, date.day).toordinal()
+                except ValueError:
+                    continue
+                self.append(id, day, age, gender, place, [counts.get(cause, 0) for cause in CAUSES])
+
+    def parse_days(self, chart: dict, id: int, gender: int, place: int):
+        """ Reads a `chart5` response: {date: {cause: [{'total': count}]}}.
+        """
+        for date, counts in chart.items():
+            day = datetime.date.fromisoformat(date).toordinal()
+            self.append(id, day, self.AGE_ALL, gender, place, [counts[cause][0]['total'] if cause in counts else 0 for cause in CAUSES])
+
+    def rows(self, state: str, city: str, region: str):
+        """ Yields result rows in `FIELDS` order, decoding the dimension codes.
+        """
+        columns = self.columns
+        fromordinal = datetime.date.fromordinal
+        dates = {}
+        for id, day, age, gender, place, *counts in zip(*(columns[name] for name in self.COLUMNS)):
+            if day not in dates:
+                dates[day] = fromordinal(day).isoformat()
+            yield (id, dates[day], state, city, region, self.GENDER_NAMES[gender], self.age_value(age), self.place_name(place), *counts)
@@ -1,34 +1,34 @@
 #!/usr/env/python3
 ## Standard Library
-from http.cookiejar import CookieJar
-from urllib.request import Request, urlopen
 from urllib.parse import urlencode
-from urllib.error import HTTPError
 from functools import wraps, reduce
+from time import perf_counter as clock
 import ctypes
 import sys
 import os
-import asyncio
 import csv
 import json
 import time
 import datetime
 import itertools
-import threading
 import multiprocessing as mp
 import warnings
 import pickle
+import hashlib
+import random
 
 ## Local
 import api_lib
 import api_db
+import api_constants
 import api_io
-from api_constants import CAUSES, STATES, ID_TABLE, YEARS, GENDERS, PLACES
-from api_constants import BEGIN, TODAY, ONE_DAY
-from api_constants import BLOCK_SIZE, CPU_COUNT, ASYNC_MODE, JUPYTER_ASYNC_LIB
+from .columns import APIColumns
+from api_constants import CAUSES, FIELDS, YEARS, GENDERS, PLACES
+from api_constants import BEGIN, TODAY, ONE_DAY, BACKFILL_DAYS, MAX_SPAN
+from api_constants import BLOCK_SIZE, CHUNK_SIZE, RESULTS_QUEUE_SIZE, POOL_SIZE, CPU_COUNT, ASYNC_MODE
 
-if ASYNC_MODE: import aiohttp
-if JUPYTER_ASYNC_LIB: import nest_asyncio
+## `asyncio`, `aiohttp`, `urllib.request` and `concurrent.futures` are imported
+## where they are used, so that `import api` stays fast (see benchmarks/import_time.py)
 
 class APIResult(object):
     """
@@ -65,9 +65,9 @@ class APIResult(object):
         return [key for key in self.__slots__ if key != 'success']
 
 class APIResults(object):
+    """ Results of a single request, stored column-wise (see `APIColumns`).
     """
-    """
-    __slots__ = ('id', 'date', 'state', 'city', 'region', 'gender', 'chart', 'places', 'age') + CAUSES + ('results', 'success')
+    __slots__ = ('id', 'date', 'state', 'city', 'region', 'gender', 'chart', 'places', 'age') + CAUSES + ('columns', 'success')
 
     __defaults = {
         'date': TODAY,
@@ -81,62 +81,46 @@ class APIResults(object):
         **{cause: 0 for cause in CAUSES},
         }
 
-    AGE_TABLE = {
-        '< 9': 0,
-        '10 - 19': 10,
-        '20 - 29': 20,
-        '30 - 39': 30,
-        '40 - 49': 40,
-        '50 - 59': 50,
-        '60 - 69': 60,
-        '70 - 79': 70,
-        '80 - 89': 80,
-        '90 - 99': 90,
-        '> 100': 100,
-        'N/I': None
-        }
-
     CAUSES = CAUSES
 
     def __init__(self, **kwargs):
         for name in self.__slots__:
-            if name in ('results', 'success'): continue
+            if name in ('columns', 'success'): continue
             if name in kwargs:
                 setattr(self, name, kwargs[name])
             else:
                 setattr(self, name, self.__defaults[name])
-        self.results = []
+        self.columns = APIColumns()
         self.success = False
 
     def __iter__(self):
         return iter(self.results)
 
+    def __len__(self):
+        return len(self.columns)
+
+    @property
+    def results(self) -> list:
+        """ Results as `APIResult` objects (built on demand).
+        """
+        return [APIResult(**{**dict(zip(FIELDS, row)), 'date': datetime.date.fromisoformat(row[1]), 'chart': self.chart}) for row in self.rows()]
+
+    def rows(self):
+        """ Yields compact result rows, in `FIELDS` order.
+        """
+        return self.columns.rows(self.state, self.city, self.region)
+
     def commit(self, response_data: dict):
         chart = response_data['chart']
         #pylint: disable=no-member
         self.chart = API.get_chart(self.gender, self.age)
+        gender = APIColumns.GENDER_CODES[self.gender]
+        place = APIColumns.place_code(self.places)
         if self.chart in {'chart2', 'chart3'}:
-            data = {'place': '&'.join(self.places)}
-            for age in chart:
-                data['age'] = self.AGE_TABLE[age]
-                for year in chart[age]:
-                    try:
-                        data['date'] = datetime.date(int(year), self.date.month, self.date.day)
-                    except ValueError:
-                        continue
-                    for cause in self.CAUSES:
-                        if cause in chart[age][year]:
-                            data[cause] = chart[age][year][cause]
-                        else:
-                            data[cause] = 0
-                    self.results.append(APIResult(**{**self, **data}))
+            self.columns.parse_ages(chart, self.id, self.date, gender, place)
         elif self.chart == 'chart5':
-            data = {'place': '&'.join(self.places)}
-            for date in chart:
-                data['date'] = datetime.date.fromisoformat(date)
-                for cause in chart[date]:
-                    data[cause] = chart[date][cause][0]['total']
-                self.results.append(APIResult(**{**self, **data}))
+            ## One result per day: the request may span several days
+            self.columns.parse_days(chart, self.id, gender, place)
         else:
             raise ValueError(f'Não sei lidar com o chart nº {self.chart}')
         self.success = True
@@ -145,7 +129,7 @@ class APIResults(object):
         return getattr(self, name)
 
     def keys(self):
-        return [key for key in self.__slots__ if key not in ('results', 'success')]
+        return [key for key in self.__slots__ if key not in ('columns', 'success')]
 
 class APIQuery(object):
     """
@@ -195,67 +179,198 @@ class APIRequestError(Exception):
         return self.msg
 
 class APIRequest(object):
+    """ Lightweight request: an index into its `APIRequestQueue` and the pre-built URL.
+        The `urllib` request, the `APIQuery` and the `APIResults` are created on demand.
+    """
 
-    __slots__ = ('url', 'query', 'results', 'request')
+    __slots__ = ('queue', 'index', 'url', 'status', 'cached', 'size', 'validators', '__request', '__results')
 
-    def __init__(self, url: str, query: APIQuery, results: APIResults, **options):
+    def __init__(self, queue, index: int, url: str):
+        self.queue = queue
+        self.index = index
         self.url = url
-        self.query = query
-        self.results = results
-        self.request = Request(f"{self.url}?{urlencode(dict(self.query), True)}", **options)
+        self.status = None ## last HTTP status, None if no answer
+        self.cached = None ## None: cache not checked yet
+        self.size = 0 ## bytes received from the network
+        self.validators = (None, None) ## (etag, last_modified) of an expired cached answer
+        self.__request = None
+        self.__results = None
     
     def __repr__(self):
         return f"APIRequest[{self.success}]"
+
+    @property
+    def request(self):
+        if self.__request is None:
+            from urllib.request import Request
+            self.__request = Request(self.url, **self.queue.options)
+            for key, value in self.conditional_headers.items():
+                self.__request.add_header(key, value)
+        return self.__request
+
+    @property
+    def headers(self) -> dict:
+        return {**self.queue.options.get('headers', {}), **self.conditional_headers}
+
+    @property
+    def conditional_headers(self) -> dict:
+        """ If-None-Match / If-Modified-Since, when an expired answer is cached.
+        """
+        return api_lib.conditional_headers(*self.validators)
+
+    @property
+    def query(self) -> APIQuery:
+        return APIQuery(**self.queue.data(self.index))
+
+    @property
+    def results(self) -> APIResults:
+        if self.__results is None:
+            self.__results = APIResults(**self.queue.data(self.index))
+        return self.__results
+
+    @property
+    def date(self) -> datetime.date:
+        """ Last day covered by the request.
+        """
+        return self.queue.end_date(self.index)
+
+    @property
+    def cache(self) -> api_lib.ResponseCache:
+        return self.queue.cache
+
+    def from_cache(self) -> bool:
+        """ Answers the request from the response cache, if possible.
+            The cache is looked up only once per request.
+        """
+        if self.cached is None:
+            raw_text = None if self.cache is None else self.cache.get(self.url, self.date)
+            if raw_text is None:
+                self.cached = False
+                if self.cache is not None:
+                    self.validators = self.cache.validators(self.url)
+            else:
+                self.commit(api_lib.decoder.loads(raw_text))
+                self.cached = True
+        return self.cached
+
+    def store(self, raw_text: bytes, headers: dict=None):
+        self.size = len(raw_text)
+        if self.cache is not None:
+            self.cache.put(self.url, self.date, raw_text, *api_lib.validators(headers))
+
+    def revalidate(self, headers: dict=None) -> bool:
+        """ 304 Not Modified: answers the request with the cached body.
+        """
+        raw_text = None if self.cache is None else self.cache.revalidate(self.url, *api_lib.validators(headers))
+        if raw_text is None:
+            return False
+        self.commit(api_lib.decoder.loads(raw_text))
+        return True
     
-    def get(self):
+    def get(self, pool: api_lib.ConnectionPool=None):
+        if self.from_cache():
+            return True
+        elif pool is not None:
+            return self.pool_get(pool)
+        from urllib.request import urlopen
+        from urllib.error import HTTPError
+        response = None
+        start = clock()
         try:
             response = urlopen(self.request)
+            self.status = response.status
             raw_text = response.read()
-            self.commit(json.loads(raw_text.decode('utf-8')))
+            self.commit(api_lib.decoder.loads(raw_text))
+            self.store(raw_text, response.headers)
             return True
         except HTTPError as error:
-            API.log(error)
+            self.status = error.code
+            if error.code == 304:
+                return self.revalidate(error.headers)
+            self.log('HTTP error in GET', start, error)
             return False
         except Exception as error:
-            API.log(error)
+            self.log(f'Error in GET: {error}', start, error)
             return False
         finally:
-            response.close()
+            if response is not None: response.close()
+
+    def pool_get(self, pool: api_lib.ConnectionPool):
+        """ GET através de uma conexão persistente do pool.
+        """
+        start = clock()
+        try:
+            status, headers, raw_text = pool.get(self.url, self.headers)
+            self.status = status
+            if status == 200:
+                self.commit(api_lib.decoder.loads(raw_text))
+                self.store(raw_text, headers)
+                return True
+            elif status == 304:
+                return self.revalidate(headers)
+            else:
+                self.log(f'Code {status} in GET', start)
+                return False
+        except Exception as error:
+            self.log(f'Error in GET: {error}', start, error)
+            return False
 
     async def async_get(self, session):
-        async with session.get(self.request.full_url) as response:
+        if self.from_cache():
+            return True
+        start = clock()
+        async with session.get(self.url, headers=self.conditional_headers) as response:
+            self.status = response.status
             try:
                 if response.status == 200:
-                    self.commit(await response.json())
+                    raw_text = await response.read()
+                    self.commit(api_lib.decoder.loads(raw_text))
+                    self.store(raw_text, response.headers)
                     return True
-                elif response.status == 403:
-                    API.log(f'Code {response.status} in GET')
+                elif response.status == 304:
+                    return self.revalidate(response.headers)
+                elif response.status in (403, 429):
+                    self.log(f'Code {response.status} in GET', start)
                     return False
                 else:
                     return False
-            except Exception:
-                API.log(f'Code {response.status} in GET with Error')
+            except Exception as error:
+                self.log(f'Code {response.status} in GET with Error', start, error)
                 return False
-            finally:
-                response.close()
+
+    def log(self, message: str, start: float=None, error: Exception=None):
+        """ Logs a failure of this request: index, status, latency and error class.
+        """
+        API.log(
+            message,
+            'WARNING',
+            request=self.index,
+            status=self.status,
+            latency=None if start is None else clock() - start,
+            error=None if error is None else error.__class__.__name__,
+        )
 
     def commit(self, response_data: dict):
         self.results.commit(response_data)
     
     @property
     def success(self):
-        return self.results.success
+        return self.__results is not None and self.__results.success
 
 class APIRequestQueue:
 
-    __slots__ = ('url', 'age', 'dates', 'cities', 'places', 'genders', 'shape', 'total', 'options')
+    __slots__ = ('url', 'age', 'dates', 'span', 'cities', 'places', 'genders', 'shape', 'total', 'cache', 'options', 'fragments')
 
-    def __init__(self, url=None, age=None, dates=None, cities=None, places=None, genders=None, **options):
+    def __init__(self, url=None, age=None, dates=None, cities=None, places=None, genders=None, cache=None, span=1, **options):
         self.url = url
+
+        ## response cache
+        self.cache = cache
         
         ## query param sources
         self.age = age
         self.dates = dates
+        self.span = span ## days per date window
         self.cities = cities
         self.places = places
         self.genders = genders
@@ -270,48 +385,102 @@ class APIRequestQueue:
 
         self.options = options
 
+        ## query string fragments, encoded once per dimension value
+        self.fragments = self.encode()
+
     def set_options(self, **options):
         self.options = options
 
-    def __getitem__(self, i: int):
+    @property
+    def fingerprint(self) -> bytes:
+        """ Identifies the index-to-query mapping of this queue. Dates enter by their
+            start and window size only: indices are date-major, so a queue ending later
+            (e.g. `date=all` on the next day) maps its first indices as this one does.
+        """
+        shape = (self.url, self.age, self.dates[0][0] if self.dates else None, self.span, self.cities, self.places, self.genders)
+        return hashlib.sha256(repr(shape).encode('utf-8')).digest()
+
+    @property
+    def stride(self) -> int:
+        """ Requests per date window.
+        """
+        return self.total // self.shape['dates'] if self.shape['dates'] else 1
+
+    @property
+    def stamp(self) -> int:
+        """ Last day requested (ordinal), which may cut the last date window short.
+        """
+        return self.dates[-1][1].toordinal() if self.dates else 0
+
+    @staticmethod
+    def fragment(**params) -> str:
+        """ Encodes `params` exactly as `urlencode(dict(APIQuery(...)), True)` would,
+            with a leading '&' (None values are left out).
+        """
+        return "".join(f"&{urlencode({key: value}, True)}" for key, value in params.items() if value is not None)
+
+    def encode(self) -> dict:
+        """ Pre-encodes the query string fragment of every value of each dimension,
+            following the order of `APIQuery.__slots__`.
+        """
+        return {
+            'dates': [self.fragment(start_date=start, end_date=end) for start, end in self.dates],
+            'cities': [self.fragment(state=state, city_id=city_id) for state, _, city_id in self.cities],
+            'genders': [self.fragment(gender=gender, chart=API.get_chart(gender, self.age)) for gender in self.genders],
+            'places': [self.fragment(**{'places[]': places}) for places in self.places],
+        }
+
+    def split(self, i: int) -> (int, int, int, int):
+        """ split(i: int) -> date, city, place, gender
+            Index of each dimension value for request `i`.
+        """
         if not (0 <= i < self.total):
             raise IndexError(f'Out of bounds for Request Queue with lenght {self.total}')
-        else:
-            data = {'id': i, 'age': self.age}
-            ## gender
-            i, j = divmod(i, self.shape['genders'])
-            gender = self.genders[j]
-            data['gender'] = gender
-
-            ## place
-            i, j = divmod(i, self.shape['places'])
-            place_list = self.places[j]
-            data['places'] = place_list
-
-            ## city
-            i, j = divmod(i, self.shape['cities'])
-            state, city, city_id = self.cities[j]
-            data['state'] = state
-            data['city'] = city
-            data['city_id'] = city_id
-
-            ## date
-            i, j = divmod(i, self.shape['dates'])
-            start_date, end_date = self.dates[j]
-            data['start_date'] = start_date
-            data['end_date'] = end_date
-            data['date'] = end_date
-
-            return APIRequest(self.url, APIQuery(**data), APIResults(**data), **self.options)
+        i, gender = divmod(i, self.shape['genders'])
+        i, place = divmod(i, self.shape['places'])
+        i, city = divmod(i, self.shape['cities'])
+        i, date = divmod(i, self.shape['dates'])
+        return date, city, place, gender
+
+    def data(self, i: int) -> dict:
+        """ Query parameters and metadata of request `i`.
+        """
+        date, city, place, gender = self.split(i)
+        state, city, city_id = self.cities[city]
+        start_date, end_date = self.dates[date]
+        return {
+            'id': i,
+            'age': self.age,
+            'gender': self.genders[gender],
+            'places': self.places[place],
+            'state': state,
+            'city': city,
+            'city_id': city_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'date': end_date,
+        }
+
+    def end_date(self, i: int) -> datetime.date:
+        return self.dates[self.split(i)[0]][1]
+
+    def full_url(self, i: int) -> str:
+        date, city, place, gender = self.split(i)
+        fragments = self.fragments
+        return f"{self.url}?{fragments['dates'][date][1:]}{fragments['cities'][city]}{fragments['genders'][gender]}{fragments['places'][place]}"
+
+    def __getitem__(self, i: int):
+        return APIRequest(self, i, self.full_url(i))
 
 class API:
 
     ## API constants
     API_URL = r'https://transparencia.registrocivil.org.br/api/covid-covid-registral'
 
-    ## City information
-    UPDATED_CITIES = False
-    STATES, ID_TABLE = STATES, ID_TABLE
+    ## City information (read on first use)
+    STATES = api_lib.lazy_attribute(lambda: api_constants.STATES)
+    ID_TABLE = api_lib.lazy_attribute(lambda: api_constants.ID_TABLE)
+    CITIES = api_lib.lazy_attribute(lambda: api_constants.CITIES)
 
     ## Years
     YEARS = YEARS
@@ -322,11 +491,13 @@ class API:
     ## Possible genders
     GENDERS = GENDERS
 
-    ## Logging
-    LOG_FNAME = 'api.log'
-    log_file = open(LOG_FNAME, 'w') ## Creates file if it does not exists, erases previous if exists
-    log_file.close()
-    log_lock = threading.Lock()
+    ## Request history (see `API.plan`)
+    STATS_FNAME = 'api.stats.json'
+
+    ## Logging (see `api_lib.LogListener`)
+    LOG_FNAME = 'api.log' ## appended to (and rotated); opened only when something is logged
+    LOG_MAX_BYTES = 8 << 20
+    LOG_BACKUPS = 3
 
     def __init__(self, 
                 date=None,
@@ -339,6 +510,19 @@ class API:
                 block_size=BLOCK_SIZE,
                 threads=CPU_COUNT,
                 output='results',
+                connector=None,
+                pool_size=POOL_SIZE,
+                limiter=None,
+                rate=None,
+                burst=None,
+                chunk_size=CHUNK_SIZE,
+                resume=False,
+                cache=False,
+                backfill=BACKFILL_DAYS,
+                ttl=None,
+                refetch=BACKFILL_DAYS,
+                span=MAX_SPAN,
+                sinks=None,
                 ):
         """ This class is intended to:
             - Prepare and enqueue request given the query specified in 
@@ -355,15 +539,36 @@ class API:
             'block_size': block_size,
             'threads': threads,
             'output': output,
+            'connector': connector,
+            'pool_size': pool_size,
+            'limiter': limiter,
+            'rate': rate,
+            'burst': burst,
+            'chunk_size': chunk_size,
+            'resume': resume,
+            'cache': cache,
+            'backfill': backfill,
+            'ttl': ttl,
+            'refetch': refetch,
+            'span': span,
+            'sinks': sinks,
         }
+        ## Output (needed to plan incremental runs)
+        self.output = self.kwargs_output(**self.kwargs)
+
+        ## Incremental runs: re-fetch window, merged into the existing output
+        self.refetch = self.kwargs_refetch(**self.kwargs)
+        self.merge = (date == 'incremental') and os.path.exists(self.output)
+
         ## Request Queue
         self.request_queue = self.get_request_queue(**self.kwargs)
 
         ## Results Queue
-        self.results_queue = mp.Queue()
+        self.results_queue = mp.Queue(RESULTS_QUEUE_SIZE) ## bounded: workers wait for a slow writer
 
-        ## IO Writer
+        ## IO Writer and extra outputs, written along with the .csv
         self.iowriter = api_io.Writer()
+        self.sinks = self.kwargs_sinks(**self.kwargs)
 
         ## Threads
         self.threads = self.kwargs_threads(**self.kwargs)
@@ -377,18 +582,43 @@ class API:
         ## Block size
         self.block_size = self.kwargs_block_size(**self.kwargs)
 
-        ## Progress
-        self.progress = api_lib.Progress(self.total, lapse=1.0)
+        ## Scheduler chunk size
+        self.chunk_size = self.kwargs_chunk_size(**self.kwargs)
 
-        ## Output
-        self.output = self.kwargs_output(**self.kwargs)
+        ## Connection pool options
+        self.connector = self.kwargs_connector(**self.kwargs)
+        self.pool_size = self.kwargs_pool_size(**self.kwargs)
+
+        ## Adaptive concurrency options
+        self.limiter = self.kwargs_limiter(**self.kwargs)
+
+        ## Global rate limit, shared by all processes
+        self.bucket = self.kwargs_rate(**self.kwargs)
+
+        ## Completion checkpoint
+        self.resume = self.kwargs_resume(**self.kwargs)
+        self.checkpoint = api_lib.Checkpoint(
+            f'{self.output}.ckpt',
+            self.total,
+            self.request_queue.fingerprint,
+            stride=self.request_queue.stride,
+            stamp=self.request_queue.stamp,
+            )
+
+        ## Progress (created when the crawl starts)
+        self.progress = None
+
+        ## Latency and size of the requests, recorded for future plans
+        self.stats = api_lib.Stats()
 
     @classmethod
-    def log(cls, s: str):
-        header = f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}]"
-        with cls.log_lock: 
-            with open(cls.LOG_FNAME, 'a') as cls.log_file:
-                print(header, s, file=cls.log_file)
+    def log(cls, s: str, level: str='INFO', **fields):
+        """ Logs `s` with the structured `fields` (request, status, latency, error).
+            During a crawl the record goes through the log queue; otherwise, straight to `LOG_FNAME`.
+        """
+        if not api_lib.logger.LOGGER.handlers:
+            api_lib.logger.attach(api_lib.logger.file_handler(cls.LOG_FNAME, cls.LOG_MAX_BYTES, cls.LOG_BACKUPS))
+        api_lib.logger.log(str(s), level, **fields)
     
     ## -- KWARGS --
     @staticmethod
@@ -409,11 +639,41 @@ class API:
         output_kwarg = kwargs['output']
         if type(output_kwarg) is not str:
             raise TypeError('Ouput name must be given as `str`')
-        elif not output_kwarg.endswith('.csv'):
+        elif not output_kwarg.endswith(('.csv', '.csv.gz')):
             return f'{output_kwarg}.csv'
         else:
             return output_kwarg
 
+    def kwargs_sinks(self, **kwargs) -> list:
+        """
+        """
+        sinks_kwarg = kwargs['sinks']
+        if sinks_kwarg is None:
+            return []
+        elif type(sinks_kwarg) is str or isinstance(sinks_kwarg, api_io.Sink):
+            sinks_kwarg = [sinks_kwarg]
+        elif type(sinks_kwarg) not in (list, tuple, set):
+            raise TypeError('`sinks` deve ser uma lista de nomes de arquivo ou de `api_io.Sink`')
+
+        sinks = []
+        for sink in sinks_kwarg:
+            if type(sink) is str:
+                sinks.append(api_io.sink(sink))
+            elif isinstance(sink, api_io.Sink):
+                sinks.append(sink)
+            else:
+                raise TypeError(f'Saída inválida `{sink!r}`: use um nome de arquivo ou um `api_io.Sink`')
+        return sinks
+
+    def kwargs_resume(self, **kwargs) -> bool:
+        """
+        """
+        resume_kwarg = kwargs['resume']
+        if type(resume_kwarg) is not bool:
+            raise TypeError('`resume` deve ser True ou False (bool)')
+        else:
+            return resume_kwarg
+
     def kwargs_threads(self, **kwargs) -> int:
         """
         """
@@ -440,6 +700,76 @@ class API:
             return block_size_kwarg
 
 
+    def kwargs_connector(self, **kwargs) -> dict:
+        """
+        """
+        connector_kwarg = kwargs['connector']
+        if connector_kwarg is None:
+            return dict(APIClient.CONNECTOR)
+        elif type(connector_kwarg) is not dict:
+            raise TypeError('`connector` deve ser um dicionário (`dict`)')
+        else:
+            connector = dict(connector_kwarg)
+            api_lib.kwget(connector, APIClient.CONNECTOR)
+            return connector
+
+    def kwargs_limiter(self, **kwargs) -> dict:
+        """
+        """
+        limiter_kwarg = kwargs['limiter']
+        if limiter_kwarg is None:
+            limiter = dict(APIClient.LIMITER)
+        elif type(limiter_kwarg) is not dict:
+            raise TypeError('`limiter` deve ser um dicionário (`dict`)')
+        else:
+            limiter = dict(limiter_kwarg)
+            api_lib.kwget(limiter, APIClient.LIMITER)
+        if self.block_size is not None:
+            limiter['maximum'] = min(limiter['maximum'], self.block_size)
+        return limiter
+
+    def kwargs_rate(self, **kwargs) -> api_lib.TokenBucket:
+        """
+        """
+        rate_kwarg = kwargs['rate']
+        burst_kwarg = kwargs['burst']
+        if rate_kwarg is None:
+            if burst_kwarg is not None:
+                raise ValueError('`burst` requer `rate`')
+            return None
+        elif type(rate_kwarg) not in (int, float):
+            raise TypeError('`rate` deve ser um número (requisições por segundo)')
+        elif rate_kwarg <= 0:
+            raise ValueError('`rate` deve ser positivo')
+        elif burst_kwarg is not None and type(burst_kwarg) is not int:
+            raise TypeError('`burst` deve ser um inteiro positivo')
+        elif burst_kwarg is not None and burst_kwarg < 1:
+            raise ValueError('`burst` deve ser um inteiro positivo')
+        else:
+            return api_lib.TokenBucket(rate_kwarg, burst_kwarg)
+
+    def kwargs_chunk_size(self, **kwargs) -> int:
+        """
+        """
+        chunk_size_kwarg = kwargs['chunk_size']
+        if type(chunk_size_kwarg) is not int:
+            raise TypeError('chunk_size is not int')
+        elif chunk_size_kwarg <= 0:
+            raise ValueError('chunk_size must be positive')
+        else:
+            return chunk_size_kwarg
+
+    def kwargs_pool_size(self, **kwargs) -> int:
+        """
+        """
+        pool_size_kwarg = kwargs['pool_size']
+        if type(pool_size_kwarg) is not int:
+            raise TypeError('pool_size is not int')
+        elif pool_size_kwarg <= 0:
+            raise ValueError('pool_size must be positive')
+        else:
+            return pool_size_kwarg
+
     def kwargs_sync(self, **kwargs) -> bool:
         """
         """
@@ -468,11 +798,11 @@ class API:
                 else:
                     places.append(place)
             else:
-                return [places]
+                return [sorted(places)]
         elif places_kwarg is all:
-            return [[place] for place in self.PLACES]
+            return [[place] for place in sorted(self.PLACES)]
         elif places_kwarg is None:
-            return [list(self.PLACES)]
+            return [sorted(self.PLACES)]
         else:
             raise TypeError('Especificação de local deve ser um conjunto (`set`) ou `all`.')
 
@@ -485,9 +815,12 @@ class API:
             start, stop = map(api_lib.get_date, date_kwarg)
         elif date_kwarg is all:
             start = BEGIN
-            stop = TODAY
+            stop = datetime.date.today()
         elif date_kwarg is None:
-            start = stop = TODAY
+            start = stop = datetime.date.today()
+        elif date_kwarg == 'incremental':
+            start = self.since_last_run(**kwargs)
+            stop = datetime.date.today()
         elif type(date_kwarg) is datetime.date or type(date_kwarg) is str:
             start = stop = api_lib.get_date(date_kwarg)
         else:
@@ -497,6 +830,63 @@ class API:
 
         return [(date, date) for date in api_lib.arange(start, stop, step)]
     
+    def kwargs_span(self, **kwargs) -> int:
+        """
+        """
+        span_kwarg = kwargs['span']
+        if type(span_kwarg) is not int:
+            raise TypeError('span is not int')
+        elif span_kwarg <= 0:
+            raise ValueError('span must be positive')
+        else:
+            return span_kwarg
+
+    @staticmethod
+    def coalesce(dates: list, span: int) -> list:
+        """ Groups consecutive (start, end) date ranges into ranges of at most `span` days.
+        """
+        windows = []
+        for start, end in dates:
+            if windows:
+                first, last = windows[-1]
+                if start == last + ONE_DAY and (end - first).days < span:
+                    windows[-1] = (first, end)
+                    continue
+            windows.append((start, end))
+        return windows
+
+    def kwargs_refetch(self, **kwargs) -> int:
+        """
+        """
+        refetch_kwarg = kwargs['refetch']
+        if type(refetch_kwarg) is not int:
+            raise TypeError('refetch is not int')
+        elif refetch_kwarg < 0:
+            raise ValueError('refetch must not be negative')
+        else:
+            return refetch_kwarg
+
+    def since_last_run(self, **kwargs) -> datetime.date:
+        """ First date of an incremental run: the latest date already stored (in the
+            output .csv or, failing that, in the `obitos` table), minus the re-fetch window.
+        """
+        output = self.kwargs_output(**kwargs)
+        ## Only a database that already exists is read (the one of a .db sink, or else the default one)
+        databases = [sink.fname for sink in self.kwargs_sinks(**kwargs) if isinstance(sink, api_io.SQLiteSink)]
+        database = next((fname for fname in [*databases, api_db.APIDB.DB_PATH] if os.path.exists(fname)), None)
+        if os.path.exists(output):
+            latest = api_io.latest_date(output)
+        elif database is not None:
+            latest = api_db.APIDB(database[:-len('.db')], build=False).latest_date()
+        else:
+            latest = None
+
+        if latest is None:
+            warnings.warn('Nenhum resultado anterior encontrado. Buscando todas as datas.', stacklevel=3)
+            return BEGIN
+        else:
+            return max(BEGIN, latest - self.kwargs_refetch(**kwargs) * ONE_DAY + ONE_DAY)
+
     def kwargs_city_state(self, **kwargs) -> list:
         """
         """
@@ -514,7 +904,7 @@ class API:
             state_sufix = state_kwarg
             states = [state_kwarg]
         elif type(state_kwarg) is set and all(s in self.STATES for s in state_kwarg):
-            states = list(state_kwarg)
+            states = sorted(state_kwarg)
         else:
             raise ValueError(f'Especificação de estado inválida: {state_kwarg}')
 
@@ -526,19 +916,40 @@ class API:
         elif city_kwarg is all:
             return [(state, city, self.city_id(state, city)) for state in states for city in self.STATES[state]]
         elif type(city_kwarg) is set:
-            return sum([self.kwargs_city_state(city=city, state=state_sufix) for city in city_kwarg], [])
+            return [city for name in sorted(city_kwarg) for city in self.kwargs_city_state(city=name, state=state_kwarg)]
         else:
             raise ValueError(f'Especificação de cidade inválida: {city}.\nO formato correto é `Nome da Cidade-UF`')
     
-    def kwargs_cache(self, **kwargs):
+    def kwargs_cache(self, **kwargs) -> api_lib.ResponseCache:
         cache_kwarg = kwargs['cache']
+        backfill_kwarg = kwargs['backfill']
+        if type(backfill_kwarg) is not int:
+            raise TypeError('backfill is not int')
+        elif backfill_kwarg < 0:
+            raise ValueError('backfill must not be negative')
+        ttl = self.kwargs_ttl(**kwargs)
+
         if type(cache_kwarg) is bool and cache_kwarg is False:
-            return cache_kwarg
+            return None
         elif type(cache_kwarg) is str:
-            return os.path.join("cache", f"{cache_kwarg}.p")
+            os.makedirs("cache", exist_ok=True)
+            return api_lib.ResponseCache(os.path.join("cache", f"{cache_kwarg}.db"), backfill=backfill_kwarg, ttl=ttl)
         else:
             raise TypeError(f"Parâmetro 'cache' deve ser do tipo 'str' ou 'False'.")
 
+    def kwargs_ttl(self, **kwargs) -> float:
+        """ Seconds a cached answer of a recent date is reused (default: `api_lib.ResponseCache.TTL`).
+        """
+        ttl_kwarg = kwargs['ttl']
+        if ttl_kwarg is None:
+            return api_lib.ResponseCache.TTL
+        elif type(ttl_kwarg) not in (int, float):
+            raise TypeError('ttl is not a number')
+        elif ttl_kwarg <= 0:
+            raise ValueError('ttl must be positive')
+        else:
+            return float(ttl_kwarg)
+
     def kwargs_gender(self, **kwargs):
         gender_kwarg = kwargs['gender']
         age_kwarg = kwargs['age']
@@ -548,12 +959,12 @@ class API:
                 raise ValueError(f"unknown gender: {gender}")
             return [gender]
         elif gender_kwarg is all:
-            return list(self.GENDERS)
+            return sorted(self.GENDERS)
         elif gender_kwarg is None:
             if age_kwarg is False:
                 return [None]
             else:
-                return list(self.GENDERS)
+                return sorted(self.GENDERS)
         else:
             raise TypeError(f"invalid gender type {type(gender_kwarg)}")
 
@@ -567,19 +978,18 @@ class API:
     ## -- KWARGS --
 
     def city_id(self, state: str, city_name: str):
+        """ Id of a city in the local list (`data/cidades.csv`); unknown cities are an
+            error with suggestions. The list is only refreshed by `API.update_cities()`.
         """
+        return self.CITIES.resolve(state, city_name)
+
+    @classmethod
+    def update_cities(cls):
+        """ Downloads the city list, if it changed, and reloads the tables.
         """
-        ascii_city_name = api_lib.ascii_decode(city_name).upper()
-        try:
-            return self.ID_TABLE[(state, ascii_city_name)]
-        except KeyError:
-            if not self.UPDATED_CITIES:
-                api_lib.update_cities()
-                self.STATES, self.ID_TABLE = api_lib.load_cities()
-                self.UPDATED_CITIES = True
-                return self.city_id(state, ascii_city_name)
-            else:
-                raise ValueError(f'Cidade não cadastrada: `{city_name} ({state})`.')
+        api_lib.update_cities()
+        cls.STATES, cls.ID_TABLE = api_lib.load_cities()
+        cls.CITIES = api_lib.CityIndex(cls.STATES, cls.ID_TABLE)
 
     def get_request_queue(self, **kwargs) -> APIRequestQueue:
         """
@@ -590,6 +1000,13 @@ class API:
         cities = self.kwargs_city_state(**kwargs)
         places = self.kwargs_places(**kwargs)
         genders = self.kwargs_gender(**kwargs)
+        cache = self.kwargs_cache(**kwargs)
+
+        ## Only 'chart5' answers day by day; other charts aggregate the whole range
+        span = 1
+        if genders == [None] and age is False:
+            span = self.kwargs_span(**kwargs)
+            dates = self.coalesce(dates, span)
 
         return APIRequestQueue(
             url=self.API_URL,
@@ -597,30 +1014,51 @@ class API:
             dates=dates,
             cities=cities,
             places=places,
-            genders=genders
+            genders=genders,
+            cache=cache,
+            span=span
             )
 
     ## Multiprocessing things
     @staticmethod
     def client_get(
-            section_num: int,
-            section: range,
+            worker_num: int,
+            scheduler: api_lib.Scheduler,
+            checkpoint: api_lib.Checkpoint,
             request_queue: APIRequestQueue,
             results_queue: mp.Queue,
             progress: api_lib.Progress,
             lock: mp.Lock,
             sync: bool,
-            block_size: int
+            block_size: int,
+            connector: dict,
+            pool_size: int,
+            limiter: dict,
+            bucket: api_lib.TokenBucket,
+            stats: api_lib.Stats,
+            log_queue: mp.Queue
         ):
+        ## Log records go to the listener of the main process
+        api_lib.logger.attach_queue(log_queue)
+
+        ## This worker's own progress counter and scheduler slot
+        progress.claim(worker_num)
+        scheduler.register(worker_num)
 
         client = APIClient(
-            section=section,
+            scheduler=scheduler,
+            checkpoint=checkpoint,
             request_queue=request_queue,
             results_queue=results_queue,
             progress=progress,
             lock=lock,
             sync=sync,
-            block_size=block_size
+            block_size=block_size,
+            connector=connector,
+            pool_size=pool_size,
+            limiter=limiter,
+            bucket=bucket,
+            stats=stats
         )
         client.get()
 
@@ -628,17 +1066,63 @@ class API:
     def get(self) -> None:
         """
         """
+        ## A checkpoint made for other parameters can not be resumed: the output would be started over
+        if self.resume and not self.checkpoint.valid() and api_io.has_rows(self.target):
+            raise ValueError(
+                f'Não é possível retomar a busca: `{self.checkpoint.fname}` não existe ou foi feito com outros parâmetros, '
+                f'e `{self.target}` já tem resultados. Use `resume=False` para buscar tudo de novo.'
+            )
+
+        ## Completed requests are skipped when resuming
+        completed = self.checkpoint.open(resume=self.resume)
+
+        ## Requests fetched again (the last date window grew) replace their rows: the run is merged,
+        ## as is one resuming an interrupted merge
+        if self.checkpoint.stale or (self.checkpoint.resumed and os.path.exists(self.partial)):
+            self.merge = True
+
+        finished = False
+        try:
+            self.crawl(completed, self.checkpoint.resumed)
+            finished = self.checkpoint.count() == self.total
+        finally:
+            ## On success and on error alike: the bitmap goes to disk
+            self.checkpoint.close()
+
+        ## Every request is done: nothing is left to resume
+        if finished:
+            self.checkpoint.remove()
+            for sink in self.sinks:
+                sink.clean()
+
+    def crawl(self, completed: int, append: bool):
+        """ Fetches the requests not completed yet (the checkpoint is open).
+        """
+        ## Progress
+        self.progress = api_lib.Progress(self.total - completed, lapse=1.0, workers=self.threads)
+
+        ## Log records of every process are written by a single listener
+        log_listener = api_lib.LogListener(self.LOG_FNAME, self.LOG_MAX_BYTES, self.LOG_BACKUPS)
+
         processes = []
-        for section_num, section in self.sections:
+        scheduler = api_lib.Scheduler(self.total, chunk_size=self.chunk_size, workers=self.threads)
+        for worker_num in range(self.threads):
             args = (
-                section_num,
-                section,
+                worker_num,
+                scheduler,
+                self.checkpoint,
                 self.request_queue,
                 self.results_queue,
                 self.progress,
                 self.lock,
                 self.sync,
-                self.block_size
+                self.block_size,
+                self.connector,
+                self.pool_size,
+                self.limiter,
+                self.bucket,
+                self.stats,
+                log_listener.queue
                 )
 
             processes.append(
@@ -649,50 +1133,175 @@ class API:
             )
 
         ## Starts displaying progress bar
+        writer = None
         try:
+            log_listener.start()
             self.progress.track(lapse=0.5)
-            self.iowriter.write(self.output, self.results_queue)
+            writer = self.iowriter.write([api_io.CSVSink(self.target), *self.sinks], self.results_queue, self.checkpoint, append)
             for process in processes:
                 process.start()
-            for process in processes:
-                process.join()
+            self.join(processes, scheduler)
         except KeyboardInterrupt:
             print('\nAborted.')
             return
         finally:
             self.progress.finish()
 
-            ## Sends end signal to writer
-            self.results_queue.put(None)
+            if self.cache is not None:
+                print(self.cache.report())
+                API.log(self.cache.report())
+
+            self.stats.save(self.STATS_FNAME, self.chart)
+
             for process in processes:
                 if process.is_alive():
                     process.kill()
 
-    def _sections(self):
-        """ This generator simply divides range(0, self.total) into `self.threads` sections
+            ## Sends end signal to writer and waits for the last rows
+            if writer is not None:
+                writer.close()
+                print(writer.report())
+                API.log(writer.report())
+
+            log_listener.stop()
+
+        ## Incremental run: new results replace the re-fetched ones
+        if self.merge:
+            api_io.merge(self.output, self.target, api_io.Writer.MERGE_KEY)
+
+    @staticmethod
+    def join(processes: list, scheduler: api_lib.Scheduler):
+        """ Waits for the workers. The indices held by a worker that dies are
+            written off, so that the others do not wait for them forever.
         """
-        if self.threads == 1:
-            yield (0, range(self.total))
-            return
+        from multiprocessing.connection import wait
+        running = {process.sentinel: (worker_num, process) for worker_num, process in enumerate(processes)}
+        while running:
+            for sentinel in wait(list(running)):
+                worker_num, process = running.pop(sentinel)
+                process.join()
+                lost = scheduler.abandon(worker_num)
+                if process.exitcode != 0:
+                    API.log(f'Worker {worker_num} exited with code {process.exitcode}', 'ERROR')
+                if lost:
+                    warnings.warn(f'{lost} requisições perdidas com o processo {worker_num}. Use `resume=True` para buscá-las de novo.', stacklevel=3)
+        if scheduler.failed:
+            warnings.warn(f'{scheduler.failed} requisições falharam {scheduler.max_attempts} vezes e foram abandonadas (ver {API.LOG_FNAME}). Use `resume=True` para tentar de novo.', stacklevel=3)
 
-        size = self.total // self.threads
-        more = self.total % self.threads
-        for i in range(self.threads - 1):
-            yield (i, range(i * size, (i + 1) * size))
-        else:
-            yield (self.threads - 1, range((self.threads - 1) * size,  self.threads * size + more))
-        
-    @property
-    def sections(self):
-        return self._sections()
-    
     @property
     def total(self):
         return self.request_queue.total
 
+    @property
+    def target(self) -> str:
+        """ File written by this run: the output itself or, if it must be merged into
+            the existing output afterwards, a partial file next to it.
+        """
+        return self.partial if self.merge else self.output
+
+    @property
+    def partial(self) -> str:
+        ext = '.csv.gz' if self.output.endswith('.gz') else '.csv'
+        return f'{self.output[:-len(ext)]}.incremental{ext}'
+
+    @property
+    def cache(self) -> api_lib.ResponseCache:
+        return self.request_queue.cache
+
     @property
     def done(self):
-        return self.progress.done
+        return 0 if self.progress is None else self.progress.done
+
+    @property
+    def chart(self) -> str:
+        """ Chart(s) requested by this crawl, e.g. 'chart5' or 'chart2+chart3'.
+        """
+        charts = {self.get_chart(gender, self.request_queue.age) for gender in self.request_queue.genders}
+        return '+'.join(sorted(charts))
+
+    ## Sample size used to estimate the cache hit rate in `API.plan`
+    PLAN_SAMPLE = 1000
+
+    def plan(self, show: bool=True) -> dict:
+        """ Describes the crawl without sending any request: dimensions, number of
+            requests, which optimizations apply and the estimated bytes and wall time
+            (from the latency recorded in previous crawls, see `STATS_FNAME`).
+        """
+        queue = self.request_queue
+        days = sum((end - start).days + 1 for start, end in queue.dates)
+        completed = self.completed
+        remaining = self.total - completed
+
+        ## Cache hits, estimated from a sample of the requests
+        if self.cache is not None and remaining:
+            sample = random.sample(range(self.total), min(self.PLAN_SAMPLE, self.total))
+            hits = sum(self.cache.peek(queue.full_url(i), queue.end_date(i)) for i in sample)
+            hit_rate = hits / len(sample)
+        else:
+            hit_rate = 0.0
+        network = round(remaining * (1.0 - hit_rate))
+
+        ## History
+        history = api_lib.Stats.load(self.STATS_FNAME).get(self.chart)
+        if history and history['requests']:
+            latency = history['latency'] / history['requests']
+            size = history['bytes'] / history['requests']
+        else:
+            latency = size = None
+
+        concurrency = self.threads * (self.pool_size if self.sync else self.limiter['initial'])
+        if latency is None:
+            seconds = None
+        else:
+            seconds = network * latency / concurrency
+            if self.bucket is not None:
+                seconds = max(seconds, network / self.bucket.rate)
+
+        plan = {
+            'chart': self.chart,
+            'dates': len(queue.dates),
+            'days': days,
+            'cities': queue.shape['cities'],
+            'places': queue.shape['places'],
+            'genders': queue.shape['genders'],
+            'requests': self.total,
+            'completed': completed,
+            'cache_hit_rate': hit_rate,
+            'network_requests': network,
+            'bytes': None if size is None else network * size,
+            'latency': latency,
+            'concurrency': concurrency,
+            'seconds': seconds,
+        }
+        if show:
+            print(self.plan_text(plan))
+        return plan
+
+    @staticmethod
+    def plan_text(plan: dict) -> str:
+        lines = [
+            f"Gráfico: {plan['chart']}",
+            f"Datas: {plan['dates']} ({plan['days']} dias) x Cidades: {plan['cities']} x Locais: {plan['places']} x Sexos: {plan['genders']}",
+            f"Requisições: {plan['requests']}",
+        ]
+        if plan['dates'] < plan['days']:
+            lines.append(f"- Agrupamento de datas: {plan['days']} dias em {plan['dates']} requisições por local")
+        if plan['completed']:
+            lines.append(f"- Retomada: {plan['completed']} requisições já concluídas")
+        if plan['cache_hit_rate']:
+            lines.append(f"- Cache: ~{100 * plan['cache_hit_rate']:.1f}% das requisições restantes")
+        lines.append(f"Requisições pela rede: ~{plan['network_requests']}")
+        if plan['seconds'] is None:
+            lines.append(f"Estimativa: sem histórico em '{API.STATS_FNAME}' para {plan['chart']}")
+        else:
+            lines.append(f"Estimativa: ~{plan['bytes'] / 2 ** 20:.1f} MiB, {api_lib.Progress.format_time(plan['seconds'])} (latência média {1000 * plan['latency']:.0f} ms, {plan['concurrency']} requisições simultâneas)")
+        return "\n".join(lines)
+
+    @property
+    def completed(self) -> int:
+        """ Number of requests already completed by a previous run (when resuming).
+        """
+        return self.checkpoint.completed() if self.resume else 0
 
 class APIClient:
 
@@ -703,18 +1312,53 @@ class APIClient:
         "Cache-Control": "max-age=0",
     }
 
+    ## Connection pool defaults (asynchronous mode)
+    CONNECTOR = {
+        'limit': 0, ## no global limit, only per host
+        'limit_per_host': 128,
+        'keepalive_timeout': 60.0, ## seconds
+        'ttl_dns_cache': 3600, ## seconds
+        'warm_up': 16, ## connections opened before the first block
+        'timeout': 60.0, ## seconds, per request
+    }
+
+    ## Adaptive concurrency defaults (see `api_lib.AIMDLimiter`)
+    LIMITER = {
+        'initial': 32,
+        'minimum': 1,
+        'maximum': 1024,
+        'increase': 1,
+        'decrease': 0.5,
+        'latency': None,
+        'tolerance': 2.0,
+        'error_rate': 0.05,
+        'window': 256,
+    }
+
+    ## Status codes that mean upstream is throttling us
+    THROTTLE_STATUS = {403, 429}
+
     def __init__(
             self,
-            section: range,
+            scheduler: api_lib.Scheduler,
+            checkpoint: api_lib.Checkpoint,
             request_queue,
             results_queue: mp.Queue,
             progress: api_lib.Progress,
             lock: mp.Lock,
             sync: bool=not ASYNC_MODE,
             block_size: int=1024,
+            connector: dict=None,
+            pool_size: int=POOL_SIZE,
+            limiter: dict=None,
+            bucket: api_lib.TokenBucket=None,
+            stats: api_lib.Stats=None,
             ):
-        ## Section
-        self.section = iter(section)
+        ## Work-stealing scheduler over the request indices
+        self.scheduler = scheduler
+
+        ## Completion bitmap (shared with the other workers and the writer)
+        self.checkpoint = checkpoint
 
         ## Requests
         self.request_queue = request_queue
@@ -728,10 +1372,8 @@ class APIClient:
         ## Lock
         self.lock = lock
 
-        ## Total requests
-        self.total = len(section)
-
         ## Cookies
+        from http.cookiejar import CookieJar
         self.cookie_jar = CookieJar()
 
         ## XRSF-Token
@@ -743,8 +1385,32 @@ class APIClient:
         ## Asynchronous Requests
         self.sync = sync
         if not self.sync:
+            import asyncio
             self.loop = asyncio.get_event_loop()
 
+        ## Connection pool
+        self.connector = dict(self.CONNECTOR) if connector is None else connector
+        self.session = None
+
+        ## Adaptive concurrency
+        self.limiter = api_lib.AIMDLimiter(**(self.LIMITER if limiter is None else limiter))
+        self.limit = 0 ## limit currently shown by the progress tracker
+
+        ## Global rate limit (shared with the other workers)
+        self.bucket = bucket
+
+        ## Latency and size of the requests (shared with the other workers)
+        self.stats = stats
+
+        ## Synchronous Requests: persistent connections shared by a thread pool
+        self.pool_size = pool_size
+        self.pool = None
+        self.executor = None
+        if self.sync:
+            import concurrent.futures
+            self.pool = api_lib.ConnectionPool(size=self.pool_size)
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size)
+
     @property
     def request_headers(self):
         """ Headers used to avoid Error 403: Forbidden
@@ -770,75 +1436,184 @@ class APIClient:
         self.xrsf_token = next(cookie for cookie in self.cookie_jar if cookie.name == "XSRF-TOKEN").value
 
     def ensure_login(self) -> None:
+        """ Garante o login e, no modo assíncrono, mantém uma sessão válida.
+            A sessão só é reconstruída quando o 'XSRF-Token' muda.
         """
-        """
+        xrsf_token = self.xrsf_token
         while True:
             try:
                 self.login()
                 break
             except Exception as error:
-                API.log(f'Error in Login: {error}')
+                API.log(f'Error in Login: {error}', 'WARNING', error=error.__class__.__name__)
                 time.sleep(5)
                 continue
         self.request_queue.set_options(headers=self.request_headers)
 
+        if not self.sync and (self.session is None or self.xrsf_token != xrsf_token):
+            self.loop.run_until_complete(self.open_session())
+
     def get(self):
+        """
+        """
+        try:
+            self._get()
+        finally:
+            if self.session is not None:
+                self.loop.run_until_complete(self.close_session())
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.pool.close()
+            self.progress.adjust_limit(-self.limit)
+
+    def _get(self):
         """
         """
         self.ensure_login()
-        requests = []
-        for block in self.blocks:
-            requests.extend(block)
-            while len(requests) >= self.block_size:
-                try:
-                    if self.sync:
-                        self.sync_run(requests)
-                    else:
-                        self.async_run(requests)
-                except Exception as error:
-                    API.log(error)
-                finally:
-                    results = []
-                    pending = []
-                    for request in requests:
-                        if request.success:
-                            results.extend(request.results)
-                        else:
-                            pending.append(request)
+        for requests in self.blocks:
+            try:
+                if self.sync:
+                    self.sync_run(requests)
+                else:
+                    self.async_run(requests)
+            except Exception as error:
+                API.log(f'Error in block: {error}', 'ERROR', error=error.__class__.__name__)
+            finally:
+                pending = []
+                indices = []
+                rows = []
+                for request in requests:
+                    if request.success:
+                        indices.append(request.index)
+                        rows.extend(request.results.rows())
                     else:
-                        if pending:
-                            self.ensure_login()
-                            requests = pending
-                        else:
-                            requests = []
+                        pending.append(request.index)
+
+                ## One batch per block; the writer marks the indices as completed once the rows are stored
+                if indices:
+                    self.results_queue.put((indices, rows))
 
-                        for result in results:
-                            self.results_queue.put(result)
+                ## Failed indices go back to the pool, for any worker to claim (up to `max_attempts` times)
+                self.scheduler.done(len(requests) - len(pending))
+                if pending:
+                    for index in self.scheduler.release(pending):
+                        API.log('Request given up after repeated failures', 'ERROR', request=index)
+                    self.ensure_login()
 
     ## Synchronous GET methods
-    def sync_request(self, request: APIRequest):
-        """ Dispara o request de maneira sequencial
+    def sync_request(self, request: APIRequest) -> bool:
+        """ Dispara o request através do pool de conexões
         """
-        if request.get(): next(self.progress)
-        
+        if request.from_cache():
+            return True
+        if self.bucket is not None: self.bucket.acquire()
+        start = clock()
+        if request.get(self.pool):
+            if self.stats is not None: self.stats.record(clock() - start, request.size)
+            return True
+        return False
 
     def sync_run(self, requests: list):
-        """ Dispara os requests de maneira sequencial
+        """ Dispara os requests em paralelo, usando `self.pool_size` threads.
+            O progresso é contado nesta thread, a única que escreve no contador do worker.
         """
-        for request in requests: self.sync_request(request)
+        import concurrent.futures
+        futures = [self.executor.submit(self.sync_request, request) for request in requests]
+        for future in concurrent.futures.as_completed(futures):
+            if future.result():
+                next(self.progress)
 
     ## Asynchronous GET methods
     async def async_request(self, request: APIRequest, session):
+        """ Dispara o request assim que houver vaga no limite de concorrência.
+        """
+        import asyncio
+        if request.from_cache():
+            next(self.progress)
+            return
+        async with self.limiter:
+            if self.bucket is not None: await self.bucket.async_acquire()
+            start = clock()
+            try:
+                success = await request.async_get(session)
+            except asyncio.TimeoutError as error:
+                request.log('Timeout in GET', start, error)
+                self.limiter.failure(throttled=True)
+                success = None
+            except Exception as error:
+                request.log(f'Error in GET: {error}', start, error)
+                self.limiter.failure(throttled=False)
+                success = None
+
+            if success:
+                latency = clock() - start
+                self.limiter.success(latency)
+                if self.stats is not None: self.stats.record(latency, request.size)
+                next(self.progress)
+            elif success is not None:
+                self.limiter.failure(throttled=(request.status in self.THROTTLE_STATUS))
+            self.update_limit()
+
+    def update_limit(self):
+        """ Mantém o limite exibido no progresso em dia com o deste worker.
         """
+        limit = self.limiter.limit
+        if limit != self.limit:
+            self.progress.adjust_limit(limit - self.limit)
+            self.limit = limit
+
+    def _resolver(self):
+        """ Resolvedor DNS assíncrono (aiodns), se disponível.
+        """
+        import aiohttp
+        try:
+            return aiohttp.AsyncResolver()
+        except (AttributeError, RuntimeError): ## aiodns not installed
+            return None
+
+    async def open_session(self):
+        """ Abre (ou reabre) a sessão persistente deste worker.
+            Todos os blocos compartilham o mesmo pool de conexões.
         """
-        if (await request.async_get(session)): next(self.progress)
+        import aiohttp
+        await self.close_session()
+        connector = aiohttp.TCPConnector(
+            limit=self.connector['limit'],
+            limit_per_host=self.connector['limit_per_host'],
+            keepalive_timeout=self.connector['keepalive_timeout'],
+            ttl_dns_cache=self.connector['ttl_dns_cache'],
+            use_dns_cache=True,
+            resolver=self._resolver(),
+        )
+        timeout = aiohttp.ClientTimeout(total=self.connector['timeout'])
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.request_headers, timeout=timeout)
+        await self.warm_up()
+
+    async def close_session(self):
+        if self.session is not None:
+            session, self.session = self.session, None
+            await session.close()
+
+    async def _warm_up(self):
+        try:
+            async with self.session.head(self.request_queue.url) as response:
+                await response.release()
+        except Exception as error:
+            API.log(f'Error in warm-up: {error}', 'WARNING', error=error.__class__.__name__)
+
+    async def warm_up(self):
+        """ Abre as primeiras conexões antes do primeiro bloco.
+        """
+        import asyncio
+        if self.connector['warm_up'] > 0:
+            await asyncio.wait([asyncio.ensure_future(self._warm_up()) for _ in range(self.connector['warm_up'])])
 
     async def _async_run(self, requests: list):
         """ Dispara os requests de maneira assíncrona.
         """
-        async with aiohttp.ClientSession(headers=self.request_headers) as session:
-            tasks = [asyncio.ensure_future(self.async_request(request, session)) for request in requests]
-            await asyncio.wait(tasks)
+        import asyncio
+        tasks = [asyncio.ensure_future(self.async_request(request, self.session)) for request in requests]
+        await asyncio.wait(tasks)
 
     def async_run(self, requests: list):
         """ Dispara os requests de maneira assíncrona.
@@ -846,21 +1621,29 @@ class APIClient:
         if not ASYNC_MODE:
             raise ImportError("Falha ao obter as bibliotecas necessárias. Requisições assíncronas indisponíveis.")
         else:
+            import asyncio
             self.loop.run_until_complete(asyncio.ensure_future(self._async_run(requests)))
 
     def _blocks(self):
-        """ This generator divides the pending requests into blocks of size `self.block_size`
+        """ This generator claims request indices from the scheduler, in chunks, until a
+            block of size `self.block_size` is filled (or no more indices are available).
         """
-        ## Returns the whole batch
-        if self.block_size is None:
-            yield [self.request_queue[next(self.section)] for _ in range(self.total)]
-        else:
-            ## Splits the batch into blocks
-            size = self.total // self.block_size
-            for _ in range(size):
-                yield [self.request_queue[next(self.section)] for _ in range(self.block_size)]
-            yield [self.request_queue[next(self.section)] for _ in range(self.total - size * self.block_size)]
-    
+        while True:
+            requests = []
+            while self.block_size is None or len(requests) < self.block_size:
+                size = None if self.block_size is None else self.block_size - len(requests)
+                chunk = self.scheduler.claim(size)
+                if chunk is None:
+                    break
+                indices = [i for i in chunk if i not in self.checkpoint]
+                self.scheduler.done(len(chunk) - len(indices))
+                requests.extend(self.request_queue[i] for i in indices)
+
+            if requests:
+                yield requests
+            elif not self.scheduler.wait():
+                return
+
     @property
     def blocks(self):
-        return self._blocks()
\ No newline at end of file
+        return self._blocks()
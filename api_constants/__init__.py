@@ -1 +1,6 @@
-from .main import *
\ No newline at end of file
+from .main import *
+from . import main as _main
+
+def __getattr__(name: str):
+    ## City tables are loaded on first access
+    return getattr(_main, name)
@@ -1,4 +1,5 @@
 import api_lib
+import importlib.util
 import datetime
 import warnings
 import sys
@@ -16,6 +17,9 @@ CAUSES = (
     'OUTRAS'
 )
 
+## Fields of a result row, in order
+FIELDS = ('id', 'date', 'state', 'city', 'region', 'gender', 'age', 'place') + CAUSES
+
 ## Possible places
 PLACES = {'HOSPITAL', 'DOMICILIO', 'VIA_PUBLICA', 'AMBULANCIA', 'OUTROS'}
 
@@ -25,26 +29,37 @@ TODAY = datetime.date.today()
 ONE_DAY = datetime.timedelta(days=1)
 YEARS = ('2019', '2020')
 
+## Registries keep backfilling the last days (see `api_lib.ResponseCache`)
+BACKFILL_DAYS = 30
+
+## Maximum number of days fetched in a single request (only for daily series)
+MAX_SPAN = 31
+
 ## Gender
 GENDERS = {"M", "F"}
 
-## City/State table
-STATES, ID_TABLE = api_lib.load_cities()
+## City/State table: `STATES`, `ID_TABLE` and `CITIES` (`api_lib.CityIndex`) are read on first access (see `__getattr__`)
+CITY_TABLES = ('STATES', 'ID_TABLE', 'CITIES')
 
 ## Default Block size
 BLOCK_SIZE = 1024
 
+## Default number of request indices claimed at once by a worker
+CHUNK_SIZE = 64
+
+## Default connection pool size (synchronous mode)
+POOL_SIZE = 16
+
+## Maximum number of result batches waiting for the writer
+RESULTS_QUEUE_SIZE = 64
+
 ## Processors
 CPU_COUNT = os.cpu_count()
 
-## Asynchronous matters
-try:
-    import aiohttp
-    ASYNC_LIB = True
-    del aiohttp
-except ImportError:
-    ASYNC_LIB = False
-    warnings.warn('Falha ao importar bilioteca `aiohttp`. Requisições assíncronas indisponíveis.', category=ImportWarning, stacklevel=2)
+## Asynchronous matters (looked up without importing it)
+ASYNC_LIB = importlib.util.find_spec('aiohttp') is not None
+if not ASYNC_LIB:
+    warnings.warn('Biblioteca `aiohttp` não encontrada. Requisições assíncronas indisponíveis.', category=ImportWarning, stacklevel=2)
 
 ## Jupyter Issues
 IN_JUPYTER = 'ipykernel' in sys.modules
@@ -60,4 +75,11 @@ if IN_JUPYTER:
 else:
     JUPYTER_ASYNC_LIB = False
 
-ASYNC_MODE = ASYNC_LIB and (not IN_JUPYTER or JUPYTER_ASYNC_LIB)
\ No newline at end of file
+ASYNC_MODE = ASYNC_LIB and (not IN_JUPYTER or JUPYTER_ASYNC_LIB)
+def __getattr__(name: str):
+    if name in CITY_TABLES:
+        global STATES, ID_TABLE, CITIES
+        STATES, ID_TABLE = api_lib.load_cities()
+        CITIES = api_lib.CityIndex(STATES, ID_TABLE)
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,120 @@
-CREATE TABLE IF EXISTS obitos (
-        /* CAUSA */
-        COVID INTEGER NOT NULL DEFAULT 0,
-        SRAG INTEGER NOT NULL DEFAULT 0,
-        PNEUMONIA INTEGER NOT NULL DEFAULT 0,
-        INSUFICIENCIA_RESPIRATORIA INTEGER NOT NULL DEFAULT 0,
-        SEPTICEMIA INTEGER NOT NULL DEFAULT 0,
-        INDETERMINADA INTEGER NOT NULL DEFAULT 0,
-        OUTRAS INTEGER NOT NULL DEFAULT 0,
-
-        /* LOCAL */
-        CIDADE TEXT,
-        ESTADO TEXT,
-        LUGAR TEXT,
-
-        /* DATA */
-        DIA DATE
-);
\ No newline at end of file
+CREATE TABLE IF NOT EXISTS obitos (
+	/* CAUSA */
+	COVID INTEGER NOT NULL DEFAULT 0,
+	SRAG INTEGER NOT NULL DEFAULT 0,
+	PNEUMONIA INTEGER NOT NULL DEFAULT 0,
+	INSUFICIENCIA_RESPIRATORIA INTEGER NOT NULL DEFAULT 0,
+	SEPTICEMIA INTEGER NOT NULL DEFAULT 0,
+	INDETERMINADA INTEGER NOT NULL DEFAULT 0,
+	OUTRAS INTEGER NOT NULL DEFAULT 0,
+
+	/* LOCAL */
+	CIDADE TEXT NOT NULL DEFAULT '',
+	ESTADO TEXT NOT NULL DEFAULT '',
+	LUGAR TEXT NOT NULL DEFAULT '',
+
+	/* DATA */
+	DIA DATE NOT NULL,
+
+	/* IDADE */
+	IDADE INTEGER NOT NULL DEFAULT -2,
+
+	/* GENERO */
+	GENERO TEXT NOT NULL DEFAULT '',
+
+	/* CHAVE */
+	UNIQUE (DIA, ESTADO, CIDADE, LUGAR, GENERO, IDADE)
+);
+
+CREATE INDEX IF NOT EXISTS obitos_cidade_dia ON obitos (ESTADO, CIDADE, DIA, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS);
+
+CREATE INDEX IF NOT EXISTS obitos_estado_dia ON obitos (ESTADO, DIA, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS);
+
+CREATE TABLE IF NOT EXISTS obitos_estado (
+	ESTADO TEXT NOT NULL DEFAULT '',
+	DIA DATE NOT NULL,
+	LUGAR TEXT NOT NULL DEFAULT '',
+	GENERO TEXT NOT NULL DEFAULT '',
+	IDADE INTEGER NOT NULL DEFAULT -2,
+	COVID INTEGER NOT NULL DEFAULT 0,
+	SRAG INTEGER NOT NULL DEFAULT 0,
+	PNEUMONIA INTEGER NOT NULL DEFAULT 0,
+	INSUFICIENCIA_RESPIRATORIA INTEGER NOT NULL DEFAULT 0,
+	SEPTICEMIA INTEGER NOT NULL DEFAULT 0,
+	INDETERMINADA INTEGER NOT NULL DEFAULT 0,
+	OUTRAS INTEGER NOT NULL DEFAULT 0,
+
+	PRIMARY KEY (ESTADO, DIA, LUGAR, GENERO, IDADE)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS obitos_estado_insert AFTER INSERT ON obitos BEGIN
+	INSERT INTO obitos_estado (ESTADO, DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT NEW.ESTADO, NEW.DIA, NEW.LUGAR, NEW.GENERO, NEW.IDADE, NEW.COVID, NEW.SRAG, NEW.PNEUMONIA, NEW.INSUFICIENCIA_RESPIRATORIA, NEW.SEPTICEMIA, NEW.INDETERMINADA, NEW.OUTRAS WHERE NEW.CIDADE != '' ON CONFLICT (ESTADO, DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TRIGGER IF NOT EXISTS obitos_estado_delete AFTER DELETE ON obitos BEGIN
+	INSERT INTO obitos_estado (ESTADO, DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT OLD.ESTADO, OLD.DIA, OLD.LUGAR, OLD.GENERO, OLD.IDADE, -OLD.COVID, -OLD.SRAG, -OLD.PNEUMONIA, -OLD.INSUFICIENCIA_RESPIRATORIA, -OLD.SEPTICEMIA, -OLD.INDETERMINADA, -OLD.OUTRAS WHERE OLD.CIDADE != '' ON CONFLICT (ESTADO, DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TRIGGER IF NOT EXISTS obitos_estado_update AFTER UPDATE ON obitos BEGIN
+	INSERT INTO obitos_estado (ESTADO, DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT OLD.ESTADO, OLD.DIA, OLD.LUGAR, OLD.GENERO, OLD.IDADE, -OLD.COVID, -OLD.SRAG, -OLD.PNEUMONIA, -OLD.INSUFICIENCIA_RESPIRATORIA, -OLD.SEPTICEMIA, -OLD.INDETERMINADA, -OLD.OUTRAS WHERE OLD.CIDADE != '' ON CONFLICT (ESTADO, DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+	INSERT INTO obitos_estado (ESTADO, DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT NEW.ESTADO, NEW.DIA, NEW.LUGAR, NEW.GENERO, NEW.IDADE, NEW.COVID, NEW.SRAG, NEW.PNEUMONIA, NEW.INSUFICIENCIA_RESPIRATORIA, NEW.SEPTICEMIA, NEW.INDETERMINADA, NEW.OUTRAS WHERE NEW.CIDADE != '' ON CONFLICT (ESTADO, DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TABLE IF NOT EXISTS obitos_brasil (
+	DIA DATE NOT NULL,
+	LUGAR TEXT NOT NULL DEFAULT '',
+	GENERO TEXT NOT NULL DEFAULT '',
+	IDADE INTEGER NOT NULL DEFAULT -2,
+	COVID INTEGER NOT NULL DEFAULT 0,
+	SRAG INTEGER NOT NULL DEFAULT 0,
+	PNEUMONIA INTEGER NOT NULL DEFAULT 0,
+	INSUFICIENCIA_RESPIRATORIA INTEGER NOT NULL DEFAULT 0,
+	SEPTICEMIA INTEGER NOT NULL DEFAULT 0,
+	INDETERMINADA INTEGER NOT NULL DEFAULT 0,
+	OUTRAS INTEGER NOT NULL DEFAULT 0,
+
+	PRIMARY KEY (DIA, LUGAR, GENERO, IDADE)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS obitos_brasil_insert AFTER INSERT ON obitos_estado BEGIN
+	INSERT INTO obitos_brasil (DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT NEW.DIA, NEW.LUGAR, NEW.GENERO, NEW.IDADE, NEW.COVID, NEW.SRAG, NEW.PNEUMONIA, NEW.INSUFICIENCIA_RESPIRATORIA, NEW.SEPTICEMIA, NEW.INDETERMINADA, NEW.OUTRAS WHERE true ON CONFLICT (DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TRIGGER IF NOT EXISTS obitos_brasil_delete AFTER DELETE ON obitos_estado BEGIN
+	INSERT INTO obitos_brasil (DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT OLD.DIA, OLD.LUGAR, OLD.GENERO, OLD.IDADE, -OLD.COVID, -OLD.SRAG, -OLD.PNEUMONIA, -OLD.INSUFICIENCIA_RESPIRATORIA, -OLD.SEPTICEMIA, -OLD.INDETERMINADA, -OLD.OUTRAS WHERE true ON CONFLICT (DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TRIGGER IF NOT EXISTS obitos_brasil_update AFTER UPDATE ON obitos_estado BEGIN
+	INSERT INTO obitos_brasil (DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT OLD.DIA, OLD.LUGAR, OLD.GENERO, OLD.IDADE, -OLD.COVID, -OLD.SRAG, -OLD.PNEUMONIA, -OLD.INSUFICIENCIA_RESPIRATORIA, -OLD.SEPTICEMIA, -OLD.INDETERMINADA, -OLD.OUTRAS WHERE true ON CONFLICT (DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+	INSERT INTO obitos_brasil (DIA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT NEW.DIA, NEW.LUGAR, NEW.GENERO, NEW.IDADE, NEW.COVID, NEW.SRAG, NEW.PNEUMONIA, NEW.INSUFICIENCIA_RESPIRATORIA, NEW.SEPTICEMIA, NEW.INDETERMINADA, NEW.OUTRAS WHERE true ON CONFLICT (DIA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TABLE IF NOT EXISTS obitos_semana (
+	ESTADO TEXT NOT NULL DEFAULT '',
+	SEMANA DATE NOT NULL,
+	LUGAR TEXT NOT NULL DEFAULT '',
+	GENERO TEXT NOT NULL DEFAULT '',
+	IDADE INTEGER NOT NULL DEFAULT -2,
+	COVID INTEGER NOT NULL DEFAULT 0,
+	SRAG INTEGER NOT NULL DEFAULT 0,
+	PNEUMONIA INTEGER NOT NULL DEFAULT 0,
+	INSUFICIENCIA_RESPIRATORIA INTEGER NOT NULL DEFAULT 0,
+	SEPTICEMIA INTEGER NOT NULL DEFAULT 0,
+	INDETERMINADA INTEGER NOT NULL DEFAULT 0,
+	OUTRAS INTEGER NOT NULL DEFAULT 0,
+
+	PRIMARY KEY (ESTADO, SEMANA, LUGAR, GENERO, IDADE)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS obitos_semana_insert AFTER INSERT ON obitos_estado BEGIN
+	INSERT INTO obitos_semana (ESTADO, SEMANA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT NEW.ESTADO, date(NEW.DIA, '-6 days', 'weekday 1'), NEW.LUGAR, NEW.GENERO, NEW.IDADE, NEW.COVID, NEW.SRAG, NEW.PNEUMONIA, NEW.INSUFICIENCIA_RESPIRATORIA, NEW.SEPTICEMIA, NEW.INDETERMINADA, NEW.OUTRAS WHERE true ON CONFLICT (ESTADO, SEMANA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TRIGGER IF NOT EXISTS obitos_semana_delete AFTER DELETE ON obitos_estado BEGIN
+	INSERT INTO obitos_semana (ESTADO, SEMANA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT OLD.ESTADO, date(OLD.DIA, '-6 days', 'weekday 1'), OLD.LUGAR, OLD.GENERO, OLD.IDADE, -OLD.COVID, -OLD.SRAG, -OLD.PNEUMONIA, -OLD.INSUFICIENCIA_RESPIRATORIA, -OLD.SEPTICEMIA, -OLD.INDETERMINADA, -OLD.OUTRAS WHERE true ON CONFLICT (ESTADO, SEMANA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
+
+CREATE TRIGGER IF NOT EXISTS obitos_semana_update AFTER UPDATE ON obitos_estado BEGIN
+	INSERT INTO obitos_semana (ESTADO, SEMANA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT OLD.ESTADO, date(OLD.DIA, '-6 days', 'weekday 1'), OLD.LUGAR, OLD.GENERO, OLD.IDADE, -OLD.COVID, -OLD.SRAG, -OLD.PNEUMONIA, -OLD.INSUFICIENCIA_RESPIRATORIA, -OLD.SEPTICEMIA, -OLD.INDETERMINADA, -OLD.OUTRAS WHERE true ON CONFLICT (ESTADO, SEMANA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+	INSERT INTO obitos_semana (ESTADO, SEMANA, LUGAR, GENERO, IDADE, COVID, SRAG, PNEUMONIA, INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA, INDETERMINADA, OUTRAS) SELECT NEW.ESTADO, date(NEW.DIA, '-6 days', 'weekday 1'), NEW.LUGAR, NEW.GENERO, NEW.IDADE, NEW.COVID, NEW.SRAG, NEW.PNEUMONIA, NEW.INSUFICIENCIA_RESPIRATORIA, NEW.SEPTICEMIA, NEW.INDETERMINADA, NEW.OUTRAS WHERE true ON CONFLICT (ESTADO, SEMANA, LUGAR, GENERO, IDADE) DO UPDATE SET COVID = COVID + excluded.COVID, SRAG = SRAG + excluded.SRAG, PNEUMONIA = PNEUMONIA + excluded.PNEUMONIA, INSUFICIENCIA_RESPIRATORIA = INSUFICIENCIA_RESPIRATORIA + excluded.INSUFICIENCIA_RESPIRATORIA, SEPTICEMIA = SEPTICEMIA + excluded.SEPTICEMIA, INDETERMINADA = INDETERMINADA + excluded.INDETERMINADA, OUTRAS = OUTRAS + excluded.OUTRAS;
+END;
\ No newline at end of file
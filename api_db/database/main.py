@@ -1,10 +1,17 @@
+from contextlib import contextmanager
+import threading
 import sqlite3
+import queue
 
 class DataBase:
 
+    ## Rows fetched at a time when streaming
+    ARRAYSIZE = 1024
+
     def __init__(self, fname: str):
         self.fname = fname
         self._conn = None
+        self._opened = []
 
     def __repr__(self):
         return f"DataBase({self.fname!r})"
@@ -14,46 +21,138 @@ class DataBase:
         db = cls(fname)
         db.connect()
         return db
-        
+
+    def new_connection(self, **params) -> sqlite3.Connection:
+        return sqlite3.connect(self.dbname, **params)
+
     def connect(self, **params):
-        self._conn = sqlite3.connect(self.dbname, **params)
+        """ Opens the connection, or keeps using the one already open.
+        """
+        if self._conn is None:
+            self._conn = self.new_connection(**params)
 
     def close(self):
-        self._conn.close()
-        self._conn = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
 
     def __enter__(self, *args, **kwargs):
-        self.connect()
+        ## An open connection is reused (and left open)
+        self._opened.append(self._conn is None)
+        if self._conn is None:
+            self.connect()
         return self
 
     def __exit__(self, *args, **kwargs):
-        self.close()
-
-    def __call__(self, cmd: str, params: tuple=None):
-        if self._conn is None: # Not connected
-            raise RuntimeError('Not connected to database.')
-        else:
-            self.cursor = self._conn.cursor()
-            
-        if params is None:
-            params = tuple()
-
-        results = []
-        try:
-            self.cursor.execute(cmd, params)
-            results = self.cursor.fetchall()
-            self._conn.commit()
-        except sqlite3.Error as error:
-            self._conn.rollback()
-            raise error
-        finally:
-            self.cursor.close()
-            return results
+        if self._opened.pop():
+            self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ The open connection (opened on first use and kept open until `close`).
+        """
+        if self._conn is None:
+            self.connect()
+        return self._conn
+
+    def __call__(self, cmd: str, params: tuple=None) -> list:
+        """ Runs `cmd` and returns all of its rows. Writes are committed; reads are not.
+        """
+        return execute(self.connection, cmd, params)
+
+    def stream(self, cmd: str, params: tuple=None, arraysize: int=None, columns: bool=False):
+        """ stream(cmd: str, params: tuple=None, arraysize: int=None, columns: bool=False)
+            Yields the rows of a query lazily, fetching `arraysize` rows at a time.
+            With `columns=True`, yields one tuple of columns per fetch instead.
+        """
+        return stream(self.connection, cmd, params, self.ARRAYSIZE if arraysize is None else arraysize, columns)
+
+    def pool(self, size: int=4):
+        """ Pool of `size` read connections, to be shared by threads.
+        """
+        return ReaderPool(self, size)
 
     @property
     def dbname(self):
         return f'{self.fname}.db'
 
+class ReaderPool:
+    """ Small pool of connections for threaded readers. Connections are opened
+        on demand (up to `size`) and reused; a thread waits while all are busy.
+    """
+
+    def __init__(self, db: DataBase, size: int=4):
+        self.db = db
+        self.size = size
+        self.__lock = threading.Lock()
+        self.__idle = queue.LifoQueue()
+        self.__opened = 0
+
+    def __repr__(self):
+        return f"ReaderPool({self.db!r}, size={self.size!r})"
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.__idle.get_nowait()
+        except queue.Empty:
+            with self.__lock:
+                opened = self.__opened < self.size
+                if opened:
+                    self.__opened += 1
+            if opened:
+                conn = self.db.new_connection(check_same_thread=False)
+            else:
+                conn = self.__idle.get()
+        try:
+            yield conn
+        finally:
+            self.__idle.put(conn)
+
+    def __call__(self, cmd: str, params: tuple=None) -> list:
+        with self.connection() as conn:
+            return execute(conn, cmd, params)
+
+    def stream(self, cmd: str, params: tuple=None, arraysize: int=None, columns: bool=False):
+        """ Same as `DataBase.stream`; the connection is held until the rows are exhausted.
+        """
+        with self.connection() as conn:
+            yield from stream(conn, cmd, params, self.db.ARRAYSIZE if arraysize is None else arraysize, columns)
+
+    def close(self):
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self.__opened = 0
 
+def execute(conn: sqlite3.Connection, cmd: str, params: tuple=None) -> list:
+    cursor = conn.cursor()
+    try:
+        cursor.execute(cmd, () if params is None else params)
+        results = cursor.fetchall()
+        if conn.in_transaction:
+            conn.commit()
+        return results
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        cursor.close()
 
-    
\ No newline at end of file
+def stream(conn: sqlite3.Connection, cmd: str, params: tuple=None, arraysize: int=1024, columns: bool=False):
+    cursor = conn.cursor()
+    cursor.arraysize = arraysize
+    try:
+        cursor.execute(cmd, () if params is None else params)
+        rows = cursor.fetchmany()
+        while rows:
+            if columns:
+                yield tuple(zip(*rows))
+            else:
+                yield from rows
+            rows = cursor.fetchmany()
+    finally:
+        cursor.close()
@@ -2,9 +2,11 @@
 import os
 import sqlite3
 import datetime
+import itertools
 
 ## Local
 from .database import DataBase
+from api_lib.cities import normalize
 
 def load(fname: str):
     with open(fname, 'r') as file:
@@ -14,17 +16,19 @@ def dump(fname: str, s: str):
     with open(fname, 'w') as file:
         return file.write(s)
 
-def flatten(x: list):
-    return sum(x, [])
-
 class APIDB(DataBase):
 
     TYPE_INT = 'INTEGER NOT NULL DEFAULT 0'
-    TYPE_TEXT = 'TEXT'
-    TYPE_DATE = 'DATE'
-    TYPE_AGE = 'INTEGER DEFAULT NULL'
+    TYPE_TEXT = "TEXT NOT NULL DEFAULT ''"
+    TYPE_DATE = 'DATE NOT NULL'
+    TYPE_AGE = 'INTEGER NOT NULL DEFAULT -2'
+
+    ## `IDADE` codes besides the age brackets (key columns can not be NULL)
+    AGE_NONE = -1 ## 'N/I'
+    AGE_ALL = -2 ## all ages (no age split)
 
     DB_FNAME = 'covid'
+    DB_PATH = f'{DB_FNAME}.db'
 
     SQL_FNAME = 'covid.sql'
 
@@ -48,108 +52,346 @@ class APIDB(DataBase):
         },
         'IDADE': {
             'IDADE': TYPE_AGE
-        }
+        },
+        'GENERO': {
+            'GENERO': TYPE_TEXT
+        },
+    }
+
+    ## Natural key: one row per day, location, place, gender and age.
+    ## `CIDADE` is stored normalized (see `record`), however the city was spelled in the request.
+    KEY = ('DIA', 'ESTADO', 'CIDADE', 'LUGAR', 'GENERO', 'IDADE')
+
+    ## `PRAGMA user_version` of the current layout (1: normalized `CIDADE`)
+    VERSION = 1
+
+    ## Covering indexes (the causes are included, so sums never touch the table)
+    INDEXES = {
+        'obitos_cidade_dia': ('ESTADO', 'CIDADE', 'DIA') + tuple(TABLE['CAUSA']),
+        'obitos_estado_dia': ('ESTADO', 'DIA') + tuple(TABLE['CAUSA']),
     }
 
     TABLE_NAME = 'obitos'
 
-    def __init__(self):
-        DataBase.__init__(self, self.DB_FNAME)
-        self.build()
+    ## Breakdowns that may be stored side by side: column, `query` argument and
+    ## the test of a row not split by it (all places joined, both genders, all ages)
+    BREAKDOWNS = (
+        ('LUGAR', 'place', "instr(LUGAR, '&') > 0"),
+        ('GENERO', 'gender', "GENERO = ''"),
+        ('IDADE', 'age', f'IDADE = {AGE_ALL}'),
+    )
+
+    ## Rollups: name -> (source table, key column -> expression over a source `{row}`, rows taken).
+    ## They are kept up to date by triggers on their source, so every upsert reaches them.
+    ROLLUPS = {
+        'obitos_estado': ('obitos', {
+            'ESTADO': '{row}.ESTADO',
+            'DIA': '{row}.DIA',
+            'LUGAR': '{row}.LUGAR',
+            'GENERO': '{row}.GENERO',
+            'IDADE': '{row}.IDADE',
+        }, "{row}.CIDADE != ''"), ## city rows only: state rows from the API would count twice
+        'obitos_brasil': ('obitos_estado', {
+            'DIA': '{row}.DIA',
+            'LUGAR': '{row}.LUGAR',
+            'GENERO': '{row}.GENERO',
+            'IDADE': '{row}.IDADE',
+        }, 'true'),
+        'obitos_semana': ('obitos_estado', {
+            'ESTADO': '{row}.ESTADO',
+            'SEMANA': "date({row}.DIA, '-6 days', 'weekday 1')", ## monday
+            'LUGAR': '{row}.LUGAR',
+            'GENERO': '{row}.GENERO',
+            'IDADE': '{row}.IDADE',
+        }, 'true'),
+    }
+
+    ## Rows per transaction of the bulk loader
+    CHUNK_SIZE = 50_000
+
+    ## Connection tuning: WAL lets readers run during a load; NORMAL sync is safe under WAL
+    PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64 * 1024, ## KiB
+        'temp_store': 'MEMORY',
+        'mmap_size': 256 * 1024 * 1024,
+    }
 
-    def connect(self, **kwargs):
-        return DataBase.connect(self, **{
+    def __init__(self, fname: str=None, build: bool=True):
+        DataBase.__init__(self, self.DB_FNAME if fname is None else fname)
+        ## Without `build`, an existing database is only read: no schema file, no migration
+        if build:
+            self.build()
+
+    def new_connection(self, **params) -> sqlite3.Connection:
+        """ Opens a tuned connection (dates parsed, `PRAGMAS` applied), for `connect`
+            and for the readers of `pool` alike.
+        """
+        conn = DataBase.new_connection(self, **{
             'detect_types': (sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES),
-            **kwargs
+            **params
             })
+        for pragma, value in self.PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma}={value}')
+        return conn
 
     def build(self):
         if not os.path.exists(self.SQL_FNAME):
             dump(self.SQL_FNAME, self.sql_template)
 
-        if not os.path.exists(self.dbname):
-            with self as db:
-                db(self.sql, None)
+        with self:
+            self.migrate()
+            for statement in self.schema:
+                self._conn.execute(statement)
+
+            ## Rollups created over existing rows start from a full aggregation
+            tables = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for statement in self.rollup_schema:
+                self._conn.execute(statement)
+            if self.normalize_cities() or not set(self.ROLLUPS) <= tables:
+                self.refresh()
+
+    def migrate(self):
+        """ Moves an `obitos` table created before the natural key existed to the
+            current schema. Rows repeated on the key (e.g. a day loaded twice) are kept once.
+        """
+        columns = {row[1] for row in self._conn.execute(f'PRAGMA table_info({self.TABLE_NAME})')}
+        if not columns or 'GENERO' in columns:
+            return
+        defaults = {'CIDADE': "''", 'ESTADO': "''", 'LUGAR': "''", 'GENERO': "''", 'IDADE': str(self.AGE_ALL)}
+        values = []
+        for column in self.COLUMNS:
+            if column not in columns:
+                values.append(defaults.get(column, '0'))
+            elif column in defaults:
+                values.append(f'COALESCE({column}, {defaults[column]})')
+            else:
+                values.append(column)
+        old = f'{self.TABLE_NAME}_old'
+        self._conn.execute('BEGIN')
+        try:
+            self._conn.execute(f'ALTER TABLE {self.TABLE_NAME} RENAME TO {old}')
+            for statement in self.schema:
+                self._conn.execute(statement)
+            self._conn.execute(f"INSERT OR REPLACE INTO {self.TABLE_NAME} {self.columns} SELECT {', '.join(values)} FROM {old} WHERE DIA IS NOT NULL")
+            self._conn.execute(f'DROP TABLE {old}')
+            self._conn.execute('COMMIT')
+        except sqlite3.Error:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def normalize_cities(self) -> int:
+        """ Rewrites the `CIDADE` of rows stored before it was normalized, once per
+            database. A row left with the same key as another is kept only once.
+            Returns the number of cities renamed (rollups must then be rebuilt).
+        """
+        (version,), = self._conn.execute('PRAGMA user_version')
+        if version >= self.VERSION:
+            return 0
+        cities = [city for city, in self._conn.execute(f'SELECT DISTINCT CIDADE FROM {self.TABLE_NAME}') if city != normalize(city)]
+        with self._conn:
+            for city in cities:
+                self._conn.execute(f'UPDATE OR REPLACE {self.TABLE_NAME} SET CIDADE = ? WHERE CIDADE = ?', (normalize(city), city))
+            self._conn.execute(f'PRAGMA user_version={self.VERSION}')
+        return len(cities)
+
+    def refresh(self):
+        """ Rebuilds every rollup table from `obitos`.
+        """
+        causes = ', '.join(self.TABLE['CAUSA'])
+        source, key, where = self.ROLLUPS['obitos_estado']
+        columns = ', '.join(key)
+        values = ', '.join(expr.format(row=source) for expr in key.values())
+        with self:
+            with self._conn:
+                for rollup in self.ROLLUPS:
+                    self._conn.execute(f'DELETE FROM {rollup}')
+                ## Triggers on `obitos_estado` fill the coarser rollups
+                self._conn.execute(
+                    f"INSERT INTO obitos_estado ({columns}, {causes}) "
+                    f"SELECT {values}, {', '.join(f'SUM({c})' for c in self.TABLE['CAUSA'])} FROM {source} "
+                    f"WHERE {where.format(row=source)} GROUP BY {values}"
+                )
 
-    def store(self, res: list):
-        """ store([API.APIRequest, ... , API.APIRequest])
+    def rollup(self, state: str=None, city: str=None, weekly: bool=False) -> (str, str):
+        """ rollup(state: str=None, city: str=None, weekly: bool=False) -> (table, time column)
+            Coarsest table able to answer a query at this level.
         """
-        rows = []
-        for req in res:
-            if not req.success:
-                continue
-            for row in self.extract(req):
-                rows.append(row)
+        if city is not None:
+            return self.TABLE_NAME, ("date(DIA, '-6 days', 'weekday 1')" if weekly else 'DIA')
+        elif weekly:
+            return 'obitos_semana', 'SEMANA'
+        elif state is not None:
+            return 'obitos_estado', 'DIA'
+        else:
+            return 'obitos_brasil', 'DIA'
 
-        query, params = self.insert_query(rows)
+    def query(self, state: str=None, city: str=None, start: datetime.date=None, end: datetime.date=None,
+              weekly: bool=False, place: str=None, gender: str=None, age: int=None) -> list:
+        """ query(...) -> [(date, COVID, ..., OUTRAS), ...]
+            Deaths per day (or week, starting on monday) for a city, a state or the
+            whole country, read from the coarsest table able to answer. `place`,
+            `gender` and `age` select stored values (see `record`); the others are summed.
+            A day holding rows split by one of those and rows not split by it (e.g.
+            crawls with and without `gender`) would count twice: ValueError.
+        """
+        table, time = self.rollup(state, city, weekly)
+        filters = {'ESTADO': state, 'CIDADE': None if city is None else normalize(city), 'LUGAR': place, 'GENERO': gender, 'IDADE': age}
+        where, params = [], []
+        for column, value in filters.items():
+            if value is not None:
+                where.append(f'{column} = ?')
+                params.append(value)
+        if start is not None:
+            where.append(f'{time} >= ?')
+            params.append(start)
+        if end is not None:
+            where.append(f'{time} <= ?')
+            params.append(end)
+        sums = ', '.join(f'SUM({c})' for c in self.TABLE['CAUSA'])
+        summed = [(column, argument, test) for column, argument, test in self.BREAKDOWNS if filters[column] is None]
+        checks = ''.join(f', MIN({test}) != MAX({test})' for _, _, test in summed)
+        sql = f'SELECT {time} AS "DIA [DATE]", {sums}{checks} FROM {table}'
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        sql += f' GROUP BY {time} ORDER BY {time}'
+        with self as db:
+            rows = db(sql, tuple(params))
+        if not summed:
+            return rows
+        width = 1 + len(self.TABLE['CAUSA'])
+        for row in rows:
+            for (column, argument, _), mixed in zip(summed, row[width:]):
+                if mixed:
+                    raise ValueError(f'Em {row[0]}, há linhas com e sem divisão por `{column}`, que seriam somadas duas vezes. Escolha uma delas com `{argument}=...`.')
+        return [row[:width] for row in rows]
 
-        return self(query, params)
+    def latest_date(self) -> datetime.date:
+        """ Most recent `DIA` stored (None if the table is empty, or missing).
+        """
+        with self as db:
+            try:
+                (latest,), = db(f'SELECT MAX(DIA) AS "DIA [DATE]" FROM {self.TABLE_NAME}')
+            except sqlite3.OperationalError:
+                return None
+        return latest
 
-    def insert_query(self, rows: list) -> (str, tuple):
-        query = f"INSERT INTO {self.TABLE_NAME} {self.columns} VALUES {self.wildcards(rows)}"
-        params = tuple(flatten(rows))
-        return query, params
+    def store(self, res: list) -> int:
+        """ store([API.APIRequest, ... , API.APIRequest]) -> int
+            Stores the results of the successful requests. Returns the number of rows.
+        """
+        return self.load(row for req in res if req.success for row in req.results.rows())
 
-    def wildcards(self, rows: list) -> str:
+    def load(self, rows, chunk_size: int=None) -> int:
+        """ load(rows: iterable, chunk_size: int=None) -> int
+            Bulk loads result rows (tuples in `api_constants.FIELDS` order), one
+            transaction every `chunk_size` rows. `rows` is consumed lazily, so it
+            may be a stream. Returns the number of rows.
         """
+        chunk_size = self.CHUNK_SIZE if chunk_size is None else chunk_size
+        total = 0
+        with self:
+            rows = iter(rows)
+            chunk = list(itertools.islice(rows, chunk_size))
+            while chunk:
+                with self._conn: ## commits, or rolls back on error
+                    self.insert(chunk)
+                total += len(chunk)
+                chunk = list(itertools.islice(rows, chunk_size))
+        return total
+
+    def insert(self, rows: list):
+        """ insert(rows: list)
+            Inserts result rows (tuples in `api_constants.FIELDS` order) in the open
+            connection. Changes are kept until `commit`.
         """
-        return ", ".join([f"({','.join(['?'] * len(row))})" for row in rows])
+        self._conn.executemany(self.insert_query, map(self.record, rows))
+
+    def commit(self):
+        self._conn.commit()
 
-    def extract(self, req):
+    def record(self, row: tuple) -> tuple:
+        """ Table record (in `COLUMNS` order) of a result row. The city name is
+            normalized ('Maricá' -> 'MARICA'), as `city=all` requests return it.
         """
+        _, date, state, city, _, gender, age, place, *causes = row
+        if age is False:
+            age = self.AGE_ALL
+        elif age is None:
+            age = self.AGE_NONE
+        return (*causes, normalize(city) if city else '', state or '', place or '', date, age, gender or '')
+
+    @property
+    def insert_query(self) -> str:
+        """ Upsert on the natural key: a row already stored is only rewritten if some count changed.
         """
-        ## get result data
-        data = req.results
-
-        ## today's date
-        today = datetime.date.today()
-
-        ## 2019 values
-        yield [self.extract_column(data, column, 2019) for column in self.columns]
-
-        ## 2020 values
-        if (data['date'] <= today):
-            yield [self.extract_column(data, column, 2020) for column in self.columns]
-    
-    def extract_column(self, data: dict, column: str, year: int):
-        if column in self.TABLE['DATA']:
-            return datetime.date(year, data['date'].month, data['date'].day)
-        elif column in self.TABLE['CAUSA']:
-            return data[f"{column}_{year}"]
-        elif column in self.TABLE['LOCAL']:
-            if column == 'CIDADE':
-                return data['city']
-            elif column == 'ESTADO':
-                return data['state']
-            elif column == 'LUGAR':
-                return data['place']
-        else:
-            raise ValueError(f"Campo {column} desconhecido.")
+        causes = tuple(self.TABLE['CAUSA'])
+        return (
+            f"INSERT INTO {self.TABLE_NAME} {self.columns} VALUES ({','.join('?' * len(self.COLUMNS))}) "
+            f"ON CONFLICT ({', '.join(self.KEY)}) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in causes)} "
+            f"WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in causes)}"
+        )
 
     @property
     def columns(self):
-        return f"({','.join(self.columns)})"
+        return f"({','.join(self.COLUMNS)})"
 
     @property
     def COLUMNS(self):
-        return sum([list(sec.keys()) for sec in self.TABLE], [])
+        return sum([list(sec.keys()) for sec in self.TABLE.values()], [])
 
     @property
     def sql(self):
         return load(self.SQL_FNAME)
 
     @property
-    def sql_template(self):
+    def schema(self) -> list:
+        """ Statements creating the table and its indexes.
+        """
         sections = []
         for section in self.TABLE:
             fields = []
             for field in self.TABLE[section]:
                 fields.append(f"{field} {self.TABLE[section][field]}")
             sections.append(f"\t/* {section} */\n\t" + ",\n\t".join(fields))
+        sections.append(f"\t/* CHAVE */\n\tUNIQUE ({', '.join(self.KEY)})")
         body = ",\n\n".join(sections)
-        return f"""CREATE TABLE IF EXISTS {self.TABLE_NAME} (
+        statements = [f"""CREATE TABLE IF NOT EXISTS {self.TABLE_NAME} (
 {body}
-);"""
+)"""]
+        for index, columns in self.INDEXES.items():
+            statements.append(f"CREATE INDEX IF NOT EXISTS {index} ON {self.TABLE_NAME} ({', '.join(columns)})")
+        return statements
+
+    @property
+    def rollup_schema(self) -> list:
+        """ Statements creating the rollup tables and the triggers that maintain them.
+        """
+        causes = tuple(self.TABLE['CAUSA'])
+        types = {**{c: t for sec in self.TABLE.values() for c, t in sec.items()}, 'SEMANA': self.TYPE_DATE}
+        statements = []
+        for rollup, (source, key, where) in self.ROLLUPS.items():
+            fields = ',\n\t'.join(f'{c} {types[c]}' for c in (*key, *causes))
+            statements.append(f"""CREATE TABLE IF NOT EXISTS {rollup} (
+\t{fields},
+
+\tPRIMARY KEY ({', '.join(key)})
+) WITHOUT ROWID""")
+
+            def upsert(row: str, sign: str) -> str:
+                values = ', '.join((*(expr.format(row=row) for expr in key.values()), *(f'{sign}{row}.{c}' for c in causes)))
+                return (
+                    f"INSERT INTO {rollup} ({', '.join((*key, *causes))}) SELECT {values} WHERE {where.format(row=row)} "
+                    f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {', '.join(f'{c} = {c} + excluded.{c}' for c in causes)};"
+                )
 
-    
+            for event, body in (('INSERT', upsert('NEW', '')), ('DELETE', upsert('OLD', '-')), ('UPDATE', upsert('OLD', '-') + '\n\t' + upsert('NEW', ''))):
+                statements.append(f"""CREATE TRIGGER IF NOT EXISTS {rollup}_{event.lower()} AFTER {event} ON {source} BEGIN
+\t{body}
+END""")
+        return statements
 
+    @property
+    def sql_template(self):
+        return ";\n\n".join(self.schema + self.rollup_schema) + ";"
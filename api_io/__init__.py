@@ -1 +1,2 @@
-from .main import *
\ No newline at end of file
+from .main import *
+from .sinks import Sink, CSVSink, JSONLSink, SQLiteSink, NumPySink, SINKS, sink
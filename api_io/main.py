@@ -7,16 +7,18 @@
     - list
 """
 ## Standard Library
+from time import perf_counter as clock
 import csv
-import json
 import os
-import queue
-import _thread as thread
+import datetime
+import threading
+import collections
 import multiprocessing as mp
 
 ## Local
 import api_lib
-from api_constants import CAUSES, BLOCK_SIZE
+from api_constants import FIELDS
+from .sinks import open_csv, sink, Sink, SinkThread
 
 def get_block(iterator, n: int) -> list:
     block = []
@@ -27,22 +29,145 @@ def get_block(iterator, n: int) -> list:
             break
     return block
 
-class Writer:
+def latest_date(fname: str) -> datetime.date:
+    """ Most recent `date` in a results .csv (None if there are no rows).
+    """
+    with open_csv(fname) as file:
+        latest = max((row['date'] for row in csv.DictReader(file) if row['date']), default=None)
+    return None if latest is None else datetime.date.fromisoformat(latest)
+
+def has_rows(fname: str) -> bool:
+    """ True if the results .csv `fname` exists and has rows past its header.
+    """
+    try:
+        with open_csv(fname) as file:
+            return sum(1 for _ in zip(range(2), csv.reader(file))) == 2
+    except FileNotFoundError:
+        return False
+
+def merge_key(row: dict, key: tuple) -> tuple:
+    """ Values of `key` in `row`, with the city normalized: a city requested by name
+        ('Maricá') and the same city from `city=all` ('MARICA') are the same row.
+    """
+    return tuple(api_lib.normalize(row[k]) if k == 'city' else row[k] for k in key)
 
-    CSV_HEADER = ('id', 'date', 'state', 'city', 'region', 'gender', 'age', 'place') + CAUSES
+def merge(fname: str, partial: str, key: tuple):
+    """ Merges the rows of `partial` into `fname`. Rows of `fname` with the same `key`
+        as a row of `partial` are replaced. `partial` is removed afterwards.
+    """
+    with open_csv(partial) as file:
+        keys = {merge_key(row, key) for row in csv.DictReader(file)}
 
-    def _write(self, fname: str, results_queue: mp.Queue):
-        if not fname.endswith('.csv'):
-            fname = f'{fname}.csv'
-        
-        with open(fname, 'w', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=self.CSV_HEADER)
+    merged = f'{fname}.merge.gz' if fname.endswith('.gz') else f'{fname}.merge'
+    with open_csv(merged, 'w') as file:
+        with open_csv(fname) as old_file:
+            reader = csv.DictReader(old_file)
+            writer = csv.DictWriter(file, fieldnames=reader.fieldnames)
             writer.writeheader()
+            for row in reader:
+                if merge_key(row, key) not in keys:
+                    writer.writerow(row)
+        with open_csv(partial) as new_file:
+            writer.writerows(csv.DictReader(new_file))
+
+    os.replace(merged, fname)
+    os.remove(partial)
+
+class Writer:
+    """ Fan-out stage: every batch of results is handed to each sink's thread.
+        Requests are marked as completed in the checkpoint once all sinks have
+        committed their rows.
+    """
+
+    CSV_HEADER = FIELDS
+
+    ## Identifies a row across runs (`id` depends on the request queue)
+    MERGE_KEY = ('date', 'state', 'city', 'region', 'gender', 'age', 'place')
+
+    def _commit(self, checkpoint: api_lib.Checkpoint, pending: collections.deque, committed: int):
+        """ Marks the requests of every batch up to `committed` as completed.
+        """
+        indices = []
+        while pending and pending[0][0] <= committed:
+            indices.extend(pending.popleft()[1])
+        if indices and checkpoint is not None:
+            checkpoint.update(indices)
+            checkpoint.flush()
+
+    def _write(self, sinks: list, results_queue: mp.Queue, checkpoint: api_lib.Checkpoint=None, append: bool=False, handle=None):
+        threads = [SinkThread(sink, append) for sink in sinks]
+        if handle is not None:
+            handle.threads = threads
+        for thread in threads:
+            thread.start()
+
+        ## Each item is a batch: (request indices, rows as tuples in `CSV_HEADER` order)
+        pending = collections.deque()
+        seq = 0
+        try:
+            item = results_queue.get(True)
+            while item is not None:
+                indices, rows = item
+                seq += 1
+                for thread in threads:
+                    thread.put(seq, rows)
+                pending.append((seq, indices))
+                if handle is not None:
+                    handle.rows += len(rows)
+                self._commit(checkpoint, pending, min(thread.committed for thread in threads))
+                item = results_queue.get(True)
+        finally:
+            for thread in threads:
+                thread.close()
+            ## A failed sink keeps its rows from being marked as completed
+            self._commit(checkpoint, pending, min((thread.committed for thread in threads), default=seq))
+
+    def write(self, sinks: list, results_queue: mp.Queue, checkpoint: api_lib.Checkpoint=None, append: bool=False):
+        """ Writes results from `results_queue` to `sinks` on background threads, until `None` is received.
+            `sinks` may be a file name (or list of them) or `Sink` objects. Returns the running `WriterHandle`.
+        """
+        if isinstance(sinks, (str, Sink)):
+            sinks = [sinks]
+        sinks = [sink(s) if isinstance(s, str) else s for s in sinks]
+        handle = WriterHandle(self, sinks, results_queue, checkpoint, append)
+        handle.start()
+        return handle
+
+class WriterHandle(threading.Thread):
+    """ Thread running a `Writer`. `close` sends the end signal and waits until
+        every row is on disk; `report` tells how fast rows were written.
+    """
+
+    def __init__(self, writer: Writer, sinks: list, results_queue: mp.Queue, checkpoint: api_lib.Checkpoint=None, append: bool=False):
+        threading.Thread.__init__(self, daemon=True)
+        self.writer = writer
+        self.sinks = sinks
+        self.results_queue = results_queue
+        self.checkpoint = checkpoint
+        self.append = append
+
+        ## Rows received, seconds since start and the sink threads
+        self.rows = 0
+        self.elapsed = 0.0
+        self.threads = []
+
+    def run(self):
+        start = clock()
+        try:
+            self.writer._write(self.sinks, self.results_queue, self.checkpoint, self.append, self)
+        finally:
+            self.elapsed = clock() - start
+
+    def close(self):
+        """ Sends the end signal and waits for the last rows to be flushed.
+        """
+        if self.is_alive():
+            self.results_queue.put(None)
+            self.join()
 
-            result = results_queue.get(True)
-            while result is not None:
-                writer.writerow({key : result[key] for key in self.CSV_HEADER})
-                result = results_queue.get(True)
+    @property
+    def errors(self) -> list:
+        return [thread.error for thread in self.threads if thread.error is not None]
 
-    def write(self, fname: str, results_queue: mp.Queue):
-        thread.start_new(self._write, (fname, results_queue))
\ No newline at end of file
+    def report(self) -> str:
+        return '\n'.join(f'Writer: {thread.report()}' for thread in self.threads)
@@ -0,0 +1,389 @@
+""" :: Sinks ::
+    =========
+
+    Destinos dos resultados de uma busca. Cada destino roda na sua própria
+    thread (`SinkThread`), com o seu próprio tamanho de lote, e recebe as
+    mesmas linhas (tuplas na ordem de `FIELDS`):
+    - .csv / .csv.gz
+    - .jsonl.gz
+    - .db (SQLite, tabela `obitos`)
+    - .npz (cubo NumPy)
+"""
+## Standard Library
+from time import perf_counter as clock
+import csv
+import gzip
+import json
+import os
+import pickle
+import queue
+import threading
+
+## Local
+import api_db
+from api_constants import CAUSES, FIELDS
+
+## Write buffer of result files, in bytes
+BUFFER_SIZE = 1 << 20
+
+## Compression level of .gz result files (favours speed: the crawl must not wait for the writer)
+GZIP_LEVEL = 1
+
+def open_csv(fname: str, mode: str='r'):
+    """ Opens a results .csv (or .csv.gz, compressed) in text mode, with a large buffer.
+    """
+    if fname.endswith('.gz'):
+        return gzip.open(fname, f'{mode}t', compresslevel=GZIP_LEVEL, encoding='utf-8', newline='')
+    else:
+        return open(fname, mode, buffering=BUFFER_SIZE, encoding='utf-8', newline='')
+
+class Sink:
+    """ Destination of result rows.
+
+        `open`, `write`, `commit` and `close` are all called from the sink's own
+        thread. Rows must be durable once `commit` returns: only then are their
+        requests marked as completed in the checkpoint.
+    """
+
+    ## Rows gathered before each `write`
+    BATCH_SIZE = 4096
+
+    def __init__(self, fname: str):
+        self.fname = fname
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.fname!r})"
+
+    def open(self, append: bool=False):
+        pass
+
+    def write(self, rows: list):
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def clean(self):
+        """ Removes what was only kept to resume the crawl (called once it is complete).
+        """
+        pass
+
+class CSVSink(Sink):
+    """ .csv (or .csv.gz) file, with a `FIELDS` header.
+    """
+
+    def __init__(self, fname: str):
+        if not fname.endswith(('.csv', '.csv.gz')):
+            fname = f'{fname}.csv'
+        Sink.__init__(self, fname)
+        self.file = None
+        self.writer = None
+
+    def open(self, append: bool=False):
+        header = not (append and os.path.exists(self.fname) and os.path.getsize(self.fname))
+        self.file = open_csv(self.fname, 'a' if append else 'w')
+        self.writer = csv.writer(self.file)
+        if header:
+            self.writer.writerow(FIELDS)
+
+    def write(self, rows: list):
+        self.writer.writerows(rows)
+
+    def commit(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = self.writer = None
+
+class JSONLSink(Sink):
+    """ One JSON object per line, gzip-compressed if the name ends in .gz.
+    """
+
+    def __init__(self, fname: str):
+        Sink.__init__(self, fname)
+        self.file = None
+
+    def open(self, append: bool=False):
+        self.file = open_csv(self.fname, 'a' if append else 'w')
+
+    def write(self, rows: list):
+        self.file.write(''.join(json.dumps(dict(zip(FIELDS, row)), separators=(',', ':')) + '\n' for row in rows))
+
+    def commit(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class SQLiteSink(Sink):
+    """ `obitos` table of an `api_db.APIDB` database (.db file).
+    """
+
+    BATCH_SIZE = 16384
+
+    def __init__(self, fname: str):
+        if not fname.endswith('.db'):
+            fname = f'{fname}.db'
+        Sink.__init__(self, fname)
+        self.db = None
+
+    def open(self, append: bool=False):
+        ## Rows are stored by key, so there is nothing to truncate
+        self.db = api_db.APIDB(self.fname[:-3])
+        self.db.connect()
+
+    def write(self, rows: list):
+        self.db.load(rows)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+class NumPySink(Sink):
+    """ Dense cube of counts saved to a .npz file when the crawl ends, with axes
+        (date, location, gender, age, place, cause). Axis labels are stored
+        alongside the cube. Requires `numpy`.
+
+        Rows are appended to a journal (`<fname>.part`) at each `commit`, so that
+        a resumed crawl (`append=True`) rebuilds the cube with the rows of the
+        runs before it. The journal is removed once the crawl is complete.
+    """
+
+    AXES = ('date', 'location', 'gender', 'age', 'place')
+
+    def __init__(self, fname: str):
+        try:
+            import numpy
+            del numpy
+        except ImportError:
+            raise ImportError('A biblioteca `numpy` é necessária para gravar resultados em .npz')
+        if not fname.endswith('.npz'):
+            fname = f'{fname}.npz'
+        Sink.__init__(self, fname)
+        self.labels = None
+        self.coords = None
+        self.counts = None
+        self.journal = None
+        self.uncommitted = None
+
+    @property
+    def journal_fname(self) -> str:
+        return f'{self.fname}.part'
+
+    def open(self, append: bool=False):
+        self.labels = {axis: {} for axis in self.AXES}
+        self.coords = {axis: [] for axis in self.AXES}
+        self.counts = []
+        self.uncommitted = []
+        if append and os.path.exists(self.journal_fname):
+            self.journal = open(self.journal_fname, 'r+b')
+            self.replay()
+        else:
+            self.journal = open(self.journal_fname, 'wb')
+
+    def replay(self):
+        """ Reads the rows committed by previous runs. A batch cut short (the
+            process died while writing it) was never committed: it is dropped.
+        """
+        end = 0
+        while True:
+            try:
+                rows = pickle.load(self.journal)
+            except (EOFError, pickle.UnpicklingError):
+                break
+            self.add(rows)
+            end = self.journal.tell()
+        self.journal.seek(end)
+        self.journal.truncate()
+
+    def index(self, axis: str, label) -> int:
+        labels = self.labels[axis]
+        if label not in labels:
+            labels[label] = len(labels)
+        return labels[label]
+
+    @staticmethod
+    def order_key(label) -> tuple:
+        if type(label) is int:
+            return (0, label, '')
+        else:
+            return (1, 0, str(label))
+
+    def add(self, rows: list):
+        index = self.index
+        coords = self.coords
+        for _, date, state, city, region, gender, age, place, *counts in rows:
+            coords['date'].append(index('date', date))
+            coords['location'].append(index('location', (state, city, region)))
+            coords['gender'].append(index('gender', gender))
+            coords['age'].append(index('age', age))
+            coords['place'].append(index('place', place))
+            self.counts.append(counts)
+
+    def write(self, rows: list):
+        self.add(rows)
+        self.uncommitted.extend(rows)
+
+    def commit(self):
+        if self.uncommitted:
+            pickle.dump(self.uncommitted, self.journal, protocol=pickle.HIGHEST_PROTOCOL)
+            self.journal.flush()
+            self.uncommitted.clear()
+
+    def close(self):
+        import numpy as np
+
+        if self.counts is None:
+            return
+        self.journal.close()
+        self.journal = None
+
+        ## Axes sorted by label (dates in order, ages by bracket)
+        order = {axis: sorted(self.labels[axis], key=self.order_key) for axis in self.AXES}
+        remap = {}
+        for axis in self.AXES:
+            position = {label: i for i, label in enumerate(order[axis])}
+            remap[axis] = np.array([position[label] for label in self.labels[axis]], dtype=np.intp)
+
+        shape = tuple(len(order[axis]) for axis in self.AXES) + (len(CAUSES),)
+        cube = np.zeros(shape, dtype=np.int64)
+        if self.counts:
+            index = tuple(remap[axis][np.array(self.coords[axis], dtype=np.intp)] for axis in self.AXES)
+            cells = np.ravel_multi_index(index, shape[:-1])
+            ## A row fetched again after a resume replaces the one in the journal
+            _, last = np.unique(cells[::-1], return_index=True)
+            keep = len(cells) - 1 - last
+            cube.reshape(-1, len(CAUSES))[cells[keep]] = np.array(self.counts, dtype=np.int64)[keep]
+
+        np.savez_compressed(
+            self.fname,
+            cube=cube,
+            date=np.array(order['date']),
+            location=np.array(['/'.join(str(x) for x in location if x) for location in order['location']]),
+            gender=np.array([str(x) for x in order['gender']]),
+            age=np.array([str(x) for x in order['age']]),
+            place=np.array(order['place']),
+            cause=np.array(CAUSES),
+        )
+        self.labels = self.coords = self.counts = self.uncommitted = None
+
+    def clean(self):
+        try:
+            os.remove(self.journal_fname)
+        except FileNotFoundError:
+            pass
+
+SINKS = {
+    '.csv': CSVSink,
+    '.csv.gz': CSVSink,
+    '.jsonl': JSONLSink,
+    '.jsonl.gz': JSONLSink,
+    '.db': SQLiteSink,
+    '.npz': NumPySink,
+}
+
+def sink(fname: str) -> Sink:
+    """ Sink for `fname`, chosen by its extension (see `SINKS`).
+    """
+    for ext in sorted(SINKS, key=len, reverse=True):
+        if fname.endswith(ext):
+            return SINKS[ext](fname)
+    raise ValueError(f'Formato de saída desconhecido `{fname}`.\nAs opções válidas são: {set(SINKS)}')
+
+class SinkThread(threading.Thread):
+    """ Feeds one sink from its own queue, gathering rows into batches of
+        `sink.BATCH_SIZE`. `committed` is the sequence number of the last
+        batch known to be durable in the sink.
+    """
+
+    ## Batches waiting for this sink
+    QUEUE_SIZE = 64
+
+    def __init__(self, sink: Sink, append: bool=False):
+        threading.Thread.__init__(self, daemon=True)
+        self.sink = sink
+        self.append = append
+        self.queue = queue.Queue(self.QUEUE_SIZE)
+        self.committed = 0
+        self.error = None
+        self.finished = False
+
+        ## Rows written, seconds spent writing them and seconds since the thread started
+        self.rows = 0
+        self.busy = 0.0
+        self.elapsed = 0.0
+
+    def put(self, seq: int, rows: list):
+        self.queue.put((seq, rows))
+
+    def close(self):
+        """ Sends the end signal and waits for the last rows.
+        """
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        start = clock()
+        try:
+            self.sink.open(self.append)
+            self._run()
+        except Exception as error:
+            self.error = error
+            ## Keeps draining, so that the other sinks are not blocked
+            while not self.finished:
+                self.finished = self.queue.get() is None
+        finally:
+            try:
+                self.sink.close()
+            except Exception as error:
+                self.error = self.error or error
+            self.elapsed = clock() - start
+
+    def _run(self):
+        batch = []
+        seq = 0
+        item = self.queue.get()
+        while item is not None:
+            seq, rows = item
+            batch.extend(rows)
+            if len(batch) >= self.sink.BATCH_SIZE or self.queue.empty():
+                self._flush(batch, seq)
+            item = self.queue.get()
+        else:
+            self.finished = True
+            self._flush(batch, seq)
+
+    def _flush(self, batch: list, seq: int):
+        start = clock()
+        if batch:
+            self.sink.write(batch)
+            self.rows += len(batch)
+            batch.clear()
+        self.sink.commit()
+        self.committed = seq
+        self.busy += clock() - start
+
+    @property
+    def rate(self) -> float:
+        """ Rows per second of wall time (the sink mostly waits for the crawl).
+        """
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def load(self) -> float:
+        """ Fraction of the wall time spent writing: near 1, the sink holds the crawl back.
+        """
+        return self.busy / self.elapsed if self.elapsed else 0.0
+
+    def report(self) -> str:
+        if self.error is not None:
+            return f'{self.sink!r}: {self.error.__class__.__name__}: {self.error}'
+        return f'{self.sink!r}: {self.rows} rows, {self.rate:.0f} rows/s, busy {100 * self.load:.1f}%'
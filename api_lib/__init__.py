@@ -1,3 +1,23 @@
 from .main import *
 from .standby import StandbyLock, standby_lock
-from .progress import Progress
\ No newline at end of file
+from .progress import Progress
+from .pool import ConnectionPool
+from .limiter import AIMDLimiter
+from .bucket import TokenBucket
+from .scheduler import Scheduler
+from .checkpoint import Checkpoint
+from .cache import ResponseCache
+from .stats import Stats
+from .decoder import use_json_backend
+from .cities import CityIndex, normalize
+
+def __getattr__(name: str):
+    ## The log (and `logging`) is only imported when first used
+    if name in ('logger', 'LogListener'):
+        import importlib
+        logger = importlib.import_module('.logger', __name__)
+        return logger if name == 'logger' else logger.LogListener
+    ## JSON backends are imported on first use too
+    if name == 'JSON_BACKENDS':
+        return decoder.backends()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,50 @@
+from time import monotonic, sleep
+import multiprocessing as mp
+
+class TokenBucket:
+    """ Token bucket shared by every process that receives it (before starting).
+
+        Tokens are refilled at `rate` per second up to `burst`. Taking a token
+        reserves it right away, possibly driving the balance negative, and
+        returns how long the caller must wait; this keeps the critical section
+        O(1) and serves waiting workers in arrival order.
+    """
+
+    __slots__ = ('rate', 'burst', '__lock', '__tokens', '__stamp')
+
+    def __init__(self, rate: float, burst: int=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        ## Requests per second
+        self.rate = float(rate)
+
+        ## Bucket capacity
+        self.burst = max(1.0, float(rate if burst is None else burst))
+
+        ## Shared state
+        self.__lock = mp.Lock()
+        self.__tokens = mp.RawValue('d', self.burst)
+        self.__stamp = mp.RawValue('d', monotonic())
+
+    def __repr__(self):
+        return f"TokenBucket(rate={self.rate!r}, burst={self.burst!r})"
+
+    def take(self, n: int=1) -> float:
+        """ take(n: int=1) -> float
+            Reserves `n` tokens and returns the time to wait (in seconds) before using them.
+        """
+        with self.__lock:
+            now = monotonic()
+            tokens = min(self.burst, self.__tokens.value + (now - self.__stamp.value) * self.rate) - n
+            self.__tokens.value = tokens
+            self.__stamp.value = now
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+    def acquire(self, n: int=1):
+        wait = self.take(n)
+        if wait: sleep(wait)
+
+    async def async_acquire(self, n: int=1):
+        import asyncio
+        wait = self.take(n)
+        if wait: await asyncio.sleep(wait)
@@ -0,0 +1,175 @@
+from time import time as now
+import multiprocessing as mp
+import threading
+import datetime
+import hashlib
+import sqlite3
+import zlib
+import os
+
+class ResponseCache:
+    """ On-disk cache of API responses, keyed on the request URL.
+
+        Bodies are stored zlib-compressed in a single SQLite file. Registries
+        keep backfilling recent dates, so an answer is only kept for good if
+        it was fetched when its date was already `backfill` days old; any other
+        answer expires `ttl` seconds after it was fetched.
+
+        An expired answer is not thrown away: its validators (ETag,
+        Last-Modified) make the next request conditional, and a 304 renews it
+        (`revalidate`) without transferring the body again. Without validators,
+        the body hash tells whether a new answer really changed.
+    """
+
+    SCHEMA = """CREATE TABLE IF NOT EXISTS responses (
+        url TEXT PRIMARY KEY,
+        date DATE NOT NULL,
+        stored REAL NOT NULL,
+        body BLOB NOT NULL,
+        etag TEXT,
+        modified TEXT,
+        hash BLOB
+    )"""
+
+    ## Columns added after the first version of the table
+    MIGRATIONS = {'etag': 'TEXT', 'modified': 'TEXT', 'hash': 'BLOB'}
+
+    ## Seconds an answer that may still change is reused before it is revalidated
+    TTL = 6 * 3600
+
+    def __init__(self, fname: str, backfill: int=30, ttl: float=None):
+        self.fname = fname
+
+        ## Freshness
+        self.backfill = datetime.timedelta(days=backfill)
+        self.ttl = self.TTL if ttl is None else ttl
+
+        ## Hit rate, shared by all processes
+        self.__lock = mp.Lock()
+        self.__hits = mp.RawValue('q', 0)
+        self.__misses = mp.RawValue('q', 0)
+        self.__revalidated = mp.RawValue('q', 0)
+
+        ## One connection per process and thread
+        self.__local = threading.local()
+
+        conn = self.connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(self.SCHEMA)
+        self.migrate(conn)
+        conn.close()
+
+    def __repr__(self):
+        return f"ResponseCache({self.fname!r}, hits={self.hits}, misses={self.misses})"
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_ResponseCache__local']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.__local = threading.local()
+
+    def migrate(self, conn: sqlite3.Connection):
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(responses)')}
+        with conn:
+            for column, decl in self.MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE responses ADD COLUMN {column} {decl}')
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.fname, timeout=30.0)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        ## Connections must not cross a fork
+        if getattr(self.__local, 'pid', None) != os.getpid():
+            self.__local.conn = self.connect()
+            self.__local.pid = os.getpid()
+        return self.__local.conn
+
+    def fresh(self, date: datetime.date, stored: float) -> bool:
+        stored_date = datetime.date.fromtimestamp(stored)
+        if stored_date - date > self.backfill: ## fetched after the backfill window closed
+            return True
+        else:
+            return now() - stored < self.ttl
+
+    def get(self, url: str, date: datetime.date) -> bytes:
+        """ get(url: str, date: datetime.date) -> bytes | None
+            Returns the cached body for `url`, or None if it is missing or stale.
+        """
+        row = self.conn.execute('SELECT stored, body FROM responses WHERE url = ?', (url,)).fetchone()
+        if row is not None and self.fresh(date, row[0]):
+            with self.__lock: self.__hits.value += 1
+            return zlib.decompress(row[1])
+        else:
+            with self.__lock: self.__misses.value += 1
+            return None
+
+    def peek(self, url: str, date: datetime.date) -> bool:
+        """ True if `url` would be served from the cache (does not count as a hit or miss).
+        """
+        row = self.conn.execute('SELECT stored FROM responses WHERE url = ?', (url,)).fetchone()
+        return row is not None and self.fresh(date, row[0])
+
+    def validators(self, url: str) -> (str, str):
+        """ validators(url: str) -> etag, last_modified
+            Validators of the answer stored for `url` (None when missing).
+        """
+        row = self.conn.execute('SELECT etag, modified FROM responses WHERE url = ?', (url,)).fetchone()
+        return (None, None) if row is None else row
+
+    def revalidate(self, url: str, etag: str=None, modified: str=None) -> bytes:
+        """ The server answered 304 for `url`: the stored body is current again.
+            Returns the body (None if it is gone).
+        """
+        with self.conn as conn:
+            conn.execute(
+                'UPDATE responses SET stored = ?, etag = coalesce(?, etag), modified = coalesce(?, modified) WHERE url = ?',
+                (now(), etag, modified, url)
+            )
+            row = conn.execute('SELECT body FROM responses WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        with self.__lock: self.__revalidated.value += 1
+        return zlib.decompress(row[0])
+
+    def put(self, url: str, date: datetime.date, body: bytes, etag: str=None, modified: str=None):
+        digest = hashlib.sha256(body).digest()
+        with self.conn as conn:
+            ## Same body as before: only the freshness and validators change
+            cursor = conn.execute(
+                'UPDATE responses SET date = ?, stored = ?, etag = ?, modified = ? WHERE url = ? AND hash = ?',
+                (date.isoformat(), now(), etag, modified, url, digest)
+            )
+            if cursor.rowcount == 0:
+                conn.execute(
+                    'INSERT OR REPLACE INTO responses (url, date, stored, body, etag, modified, hash) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (url, date.isoformat(), now(), zlib.compress(body), etag, modified, digest)
+                )
+
+    @property
+    def hits(self) -> int:
+        return self.__hits.value
+
+    @property
+    def misses(self) -> int:
+        return self.__misses.value
+
+    @property
+    def revalidated(self) -> int:
+        """ Misses answered with 304 (unchanged), without transferring the body.
+        """
+        return self.__revalidated.value
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self) -> str:
+        return f'Cache: {self.hits} hits, {self.misses} misses ({100 * self.hit_rate:.1f}%), {self.revalidated} revalidated (304)'
@@ -0,0 +1,166 @@
+import multiprocessing as mp
+import struct
+import mmap
+import os
+
+class Checkpoint:
+    """ Persistent completion bitmap over `range(total)`.
+
+        The file holds a header (magic, fingerprint of the request queue, total,
+        stride and stamp) followed by one bit per index. It is memory mapped, so
+        marking an index is O(1) and is seen by every process sharing the mapping.
+
+        Indices come in groups of `stride` (one per date window, in date order),
+        so a queue that only grew by later windows keeps the bits it had. `stamp`
+        identifies the last window (its end date): when it changed, the former
+        last group is cleared, since that window may cover more days now.
+    """
+
+    MAGIC = b'APICKPT2'
+    HEADER = struct.Struct('<8s32sQQQ') ## magic, sha256 fingerprint, total, stride, stamp
+
+    def __init__(self, fname: str, total: int, fingerprint: bytes, stride: int=1, stamp: int=0):
+        self.fname = fname
+        self.total = total
+        self.fingerprint = fingerprint
+        self.stride = max(stride, 1)
+        self.stamp = stamp
+
+        ## Bits are set under this lock (neighbouring indices share a byte)
+        self.lock = mp.Lock()
+
+        self.resumed = False
+        self.stale = 0 ## completed indices cleared by `open` (their window changed)
+        self.__file = None
+        self.__map = None
+
+    def __repr__(self):
+        return f"Checkpoint({self.fname!r}, total={self.total!r})"
+
+    def __getstate__(self):
+        ## The mapping is reopened (not copied) by the receiving process
+        state = self.__dict__.copy()
+        state['_Checkpoint__file'] = state['_Checkpoint__map'] = None
+        return state, self.__map is not None
+
+    def __setstate__(self, state: tuple):
+        state, opened = state
+        self.__dict__.update(state)
+        if opened:
+            self.__mmap()
+
+    @property
+    def size(self) -> int:
+        return self.HEADER.size + (self.total + 7) // 8
+
+    @property
+    def header(self) -> bytes:
+        return self.HEADER.pack(self.MAGIC, self.fingerprint, self.total, self.stride, self.stamp)
+
+    def stored(self):
+        """ stored() -> (total, stamp) | None
+            Header of the file on disk, if it was made for this same queue (or
+            for the first `total` indices of it); None otherwise.
+        """
+        try:
+            with open(self.fname, 'rb') as file:
+                header = file.read(self.HEADER.size)
+                size = os.fstat(file.fileno()).st_size
+        except FileNotFoundError:
+            return None
+        if len(header) != self.HEADER.size:
+            return None
+        magic, fingerprint, total, stride, stamp = self.HEADER.unpack(header)
+        if (magic, fingerprint, stride) != (self.MAGIC, self.fingerprint, self.stride):
+            return None
+        elif total > self.total or total % stride or size != self.HEADER.size + (total + 7) // 8:
+            return None
+        return total, stamp
+
+    def valid(self) -> bool:
+        """ True if the file on disk can be resumed by this request queue.
+        """
+        return self.stored() is not None
+
+    def completed(self) -> int:
+        """ Number of completed indices on disk that still hold (0 if the file does not match this queue).
+        """
+        stored = self.stored()
+        if stored is None:
+            return 0
+        total, stamp = stored
+        with open(self.fname, 'rb') as file:
+            file.seek(self.HEADER.size)
+            bits = int.from_bytes(file.read(), 'little')
+        if stamp != self.stamp:
+            bits &= (1 << max(total - self.stride, 0)) - 1
+        return bin(bits).count('1')
+
+    def __mmap(self):
+        self.__file = open(self.fname, 'r+b')
+        self.__map = mmap.mmap(self.__file.fileno(), self.size)
+
+    def open(self, resume: bool=False) -> int:
+        """ open(resume: bool=False) -> int
+            Opens the bitmap, keeping previous progress if `resume` is set and
+            the file matches this queue. Returns the number of completed indices.
+        """
+        stored = self.stored() if resume else None
+        self.resumed = stored is not None
+        ## A resumed file keeps its bits; the windows added since start as pending
+        with open(self.fname, 'r+b' if self.resumed else 'wb') as file:
+            file.write(self.header)
+            file.truncate(self.size)
+        self.__mmap()
+        self.stale = 0
+        if self.resumed and stored[1] != self.stamp:
+            total, _ = stored
+            stale = range(max(total - self.stride, 0), total)
+            self.stale = sum(i in self for i in stale)
+            self.discard(stale)
+        return self.count()
+
+    def close(self):
+        """ Writes the bitmap to disk and unmaps it.
+        """
+        if self.__map is not None:
+            self.__map.flush()
+            self.__map.close()
+            self.__file.close()
+            self.__map = self.__file = None
+
+    def remove(self):
+        """ Deletes the file (nothing is left to resume).
+        """
+        self.close()
+        try:
+            os.remove(self.fname)
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, i: int) -> bool:
+        return bool(self.__map[self.HEADER.size + (i >> 3)] & (1 << (i & 7)))
+
+    def add(self, i: int):
+        pos = self.HEADER.size + (i >> 3)
+        with self.lock:
+            self.__map[pos] |= (1 << (i & 7))
+
+    def update(self, indices):
+        with self.lock:
+            for i in indices:
+                pos = self.HEADER.size + (i >> 3)
+                self.__map[pos] |= (1 << (i & 7))
+
+    def discard(self, indices):
+        with self.lock:
+            for i in indices:
+                pos = self.HEADER.size + (i >> 3)
+                self.__map[pos] &= ~(1 << (i & 7)) & 0xFF
+
+    def flush(self):
+        if self.__map is not None:
+            self.__map.flush()
+
+    def count(self) -> int:
+        return bin(int.from_bytes(self.__map[self.HEADER.size:], 'little')).count('1')
@@ -0,0 +1,114 @@
+from bisect import bisect_left
+import unicodedata
+
+## Combining marks left by NFKD (accents, cedilla), removed with `str.translate`
+COMBINING = dict.fromkeys(range(0x0300, 0x0370))
+
+def normalize(name: str) -> str:
+    """ normalize(name: str) -> str
+        Key of a city name: no accents, upper case, single spaces ('São  Paulo' -> 'SAO PAULO').
+    """
+    if not name.isascii():
+        name = unicodedata.normalize('NFKD', name).translate(COMBINING)
+    return ' '.join(name.upper().split())
+
+def edit_distance(a: str, b: str, bound: int) -> int:
+    """ Levenshtein distance between `a` and `b`, or `bound + 1` as soon as it is known to exceed `bound`.
+    """
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        last, row[0] = row[0], i
+        for j, y in enumerate(b, 1):
+            last, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, last + (x != y))
+        if min(row) > bound:
+            return bound + 1
+    return row[-1]
+
+class CityIndex:
+    """ Cities of `data/cidades.csv`, indexed by normalized name.
+
+        Exact lookups are a dict access; prefix lookups bisect a sorted array
+        of names; suggestions for misspelled names are the closest names by
+        edit distance. Nothing here goes to the network: a city missing from
+        the list is an error (see `api_lib.update_cities` to refresh it).
+    """
+
+    __slots__ = ('states', 'ids', 'keys', 'entries')
+
+    ## Edit distance and number of suggestions offered for an unknown city
+    MAX_DISTANCE = 2
+    MAX_SUGGESTIONS = 5
+
+    def __init__(self, states: dict, id_table: dict):
+        ## {state: [name, ...]} and {(state, name): id}, as read by `api_lib.load_cities`
+        self.states = states
+        self.ids = id_table
+
+        ## (name, state) in order, with the names alone alongside for `bisect`
+        self.entries = sorted((name, state) for state, name in id_table)
+        self.keys = [name for name, _ in self.entries]
+
+    def __repr__(self):
+        return f"CityIndex({len(self)} cities)"
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, city: tuple) -> bool:
+        state, name = city
+        return (state, normalize(name)) in self.ids
+
+    def get(self, state: str, name: str, default=None):
+        return self.ids.get((state, normalize(name)), default)
+
+    def resolve(self, state: str, name: str):
+        """ resolve(state: str, name: str) -> id
+            Raises ValueError (with suggestions) for unknown cities.
+        """
+        key = normalize(name)
+        try:
+            return self.ids[(state, key)]
+        except KeyError:
+            pass
+        if state not in self.states:
+            raise ValueError(f'Estado desconhecido: `{state}`.\nAs opções válidas são: {" - ".join(sorted(self.states))}')
+        suggestions = self.suggest(state, key)
+        if suggestions:
+            raise ValueError(f'Cidade não cadastrada: `{name} ({state})`. Você quis dizer: {", ".join(suggestions)}?')
+        else:
+            raise ValueError(f'Cidade não cadastrada: `{name} ({state})`.')
+
+    def prefix(self, prefix: str, state: str=None) -> list:
+        """ prefix(prefix: str, state: str=None) -> [(state, name), ...]
+            Cities whose normalized name starts with `prefix`, in alphabetical order.
+        """
+        prefix = normalize(prefix)
+        cities = []
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            name, city_state = self.entries[i]
+            if state is None or city_state == state:
+                cities.append((city_state, name))
+            i += 1
+        return cities
+
+    def suggest(self, state: str, name: str, max_distance: int=None, limit: int=None) -> list:
+        """ Names of `state` (or of every state, if `None`) closest to `name`, up to `max_distance` edits away.
+        """
+        max_distance = self.MAX_DISTANCE if max_distance is None else max_distance
+        limit = self.MAX_SUGGESTIONS if limit is None else limit
+        key = normalize(name)
+        states = self.states if state is None else [state]
+        scored = []
+        for city_state in states:
+            for city in self.states.get(city_state, ()):
+                distance = edit_distance(key, city, max_distance)
+                if distance <= max_distance:
+                    scored.append((distance, city, city_state))
+        scored.sort()
+        if state is None:
+            return [f'{city}-{city_state}' for _, city, city_state in scored[:limit]]
+        else:
+            return [city for _, city, _ in scored[:limit]]
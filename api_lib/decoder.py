@@ -0,0 +1,56 @@
+""" JSON decoding of API responses.
+
+    Responses are decoded straight from the `bytes` read from the socket, with
+    the fastest backend available: `orjson`, then `ujson`, then the standard
+    library (which also accepts `bytes`, detecting the encoding itself).
+    Backends are imported when the first response is decoded, not with `api`.
+"""
+import functools
+import importlib
+
+## Backends, fastest first
+BACKENDS = ('orjson', 'ujson', 'json')
+
+## Selected backend (until the first `loads` or `use_json_backend`, none)
+JSON_BACKEND = None
+
+json_loads = None
+
+@functools.lru_cache(maxsize=None)
+def backends() -> dict:
+    """ backends() -> {name: loads}
+        Backends installed, imported on the first call.
+    """
+    found = {}
+    for name in BACKENDS:
+        try:
+            found[name] = importlib.import_module(name).loads
+        except ImportError:
+            pass
+    return found
+
+def use_json_backend(name: str=None):
+    """ Selects the JSON backend by name (see `backends`), or the fastest one if `None`.
+        Must be called before the worker processes are started.
+    """
+    global JSON_BACKEND, json_loads
+    available = backends()
+    if name is None:
+        name = next(backend for backend in BACKENDS if backend in available)
+    elif name not in available:
+        raise ValueError(f'Decodificador JSON indisponível `{name}`.\nAs opções válidas são: {set(available)}')
+    JSON_BACKEND = name
+    json_loads = available[name]
+
+def loads(data: bytes) -> object:
+    """ loads(data: bytes) -> object
+        Decodes a JSON document with the selected backend.
+    """
+    if json_loads is None:
+        use_json_backend()
+    return json_loads(data)
+
+def __getattr__(name: str):
+    if name == 'JSON_BACKENDS':
+        return backends()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,142 @@
+from time import perf_counter as clock
+from collections import deque
+
+class AIMDLimiter:
+    """ Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+        The limit grows by `increase` after every healthy round (`limit` answers
+        with p95 latency under target and error rate under `error_rate`) and is
+        multiplied by `decrease` on throttling (403, 429, timeouts) or when
+        latency degrades. At most one decrease happens per p95 latency interval,
+        so a single burst of errors is punished only once.
+    """
+
+    def __init__(self,
+            initial: int=32,
+            minimum: int=1,
+            maximum: int=1024,
+            increase: int=1,
+            decrease: float=0.5,
+            latency: float=None,
+            tolerance: float=2.0,
+            error_rate: float=0.05,
+            window: int=256,
+        ):
+        ## Limits
+        self.minimum = minimum
+        self.maximum = maximum
+        self.__limit = float(max(minimum, min(initial, maximum)))
+
+        ## Steps
+        self.increase = increase
+        self.decrease = decrease
+
+        ## Health thresholds
+        self.latency = latency ## target p95 in seconds; None for `tolerance` x best p95 seen
+        self.tolerance = tolerance
+        self.error_rate = error_rate
+        self.__best = None
+
+        ## Recent history
+        self.__latencies = deque(maxlen=window)
+        self.__errors = deque(maxlen=window)
+        self.__round = 0
+        self.__last_decrease = 0.0
+
+        ## In-flight requests
+        self.__in_flight = 0
+        self.__condition = None
+
+    def __repr__(self):
+        return f"AIMDLimiter(limit={self.limit}, in_flight={self.in_flight})"
+
+    @property
+    def limit(self) -> int:
+        return int(self.__limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    @property
+    def p95(self) -> float:
+        if not self.__latencies:
+            return None
+        latencies = sorted(self.__latencies)
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    @property
+    def errors(self) -> float:
+        if not self.__errors:
+            return 0.0
+        return sum(self.__errors) / len(self.__errors)
+
+    @property
+    def target(self) -> float:
+        if self.latency is not None:
+            return self.latency
+        elif self.__best is None:
+            return None
+        else:
+            return self.tolerance * self.__best
+
+    @property
+    def condition(self):
+        if self.__condition is None:
+            import asyncio
+            self.__condition = asyncio.Condition()
+        return self.__condition
+
+    async def acquire(self):
+        async with self.condition:
+            while self.__in_flight >= self.limit:
+                await self.condition.wait()
+            self.__in_flight += 1
+
+    async def release(self):
+        async with self.condition:
+            self.__in_flight -= 1
+            self.condition.notify(max(1, self.limit - self.__in_flight))
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.release()
+
+    def success(self, latency: float):
+        """ Registers a healthy answer that took `latency` seconds.
+        """
+        self.__latencies.append(latency)
+        self.__errors.append(False)
+
+        self.__round += 1
+        if self.__round < self.limit:
+            return
+        self.__round = 0
+
+        p95 = self.p95
+        if self.__best is None or p95 < self.__best:
+            self.__best = p95
+
+        target = self.target
+        if target is not None and p95 > target:
+            self.backoff()
+        elif self.errors <= self.error_rate:
+            self.__limit = min(self.maximum, self.__limit + self.increase)
+
+    def failure(self, throttled: bool=True):
+        """ Registers a failed request. Throttling (403, 429, timeouts) backs off.
+        """
+        self.__errors.append(True)
+        if throttled or self.errors > self.error_rate:
+            self.backoff()
+
+    def backoff(self):
+        now = clock()
+        if now - self.__last_decrease < (self.p95 or 0.0):
+            return
+        self.__last_decrease = now
+        self.__round = 0
+        self.__limit = max(self.minimum, self.__limit * self.decrease)
@@ -0,0 +1,129 @@
+""" Structured log shared by every process of a crawl.
+
+    Workers only put records on a multiprocessing queue (`QueueHandler`);
+    a single listener thread in the main process writes them to the log file,
+    in batches (`MemoryHandler`) and with rotation (`RotatingFileHandler`).
+    Records carry the request index, HTTP status, latency and error class,
+    written as `key=value` after the message.
+"""
+import multiprocessing as mp
+import logging
+
+LOGGER = logging.getLogger('api')
+LOGGER.setLevel(logging.INFO)
+LOGGER.propagate = False
+
+class Formatter(logging.Formatter):
+
+    ## Structured fields (passed as `extra`), in order
+    FIELDS = ('request', 'status', 'latency', 'error')
+
+    def __init__(self):
+        logging.Formatter.__init__(self, '[%(asctime)s] %(levelname)s %(processName)s: %(message)s', '%Y-%m-%d %H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = logging.Formatter.format(self, record)
+        fields = []
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                fields.append(f'{field}={value:.3f}' if type(value) is float else f'{field}={value}')
+        return f"{line} {' '.join(fields)}" if fields else line
+
+class QueueHandler(logging.Handler):
+    """ Puts records on a multiprocessing queue as they are (pickling happens in the
+        queue's feeder thread). Messages are plain strings, so nothing is formatted here.
+    """
+
+    def __init__(self, queue: mp.Queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+def file_handler(fname: str, max_bytes: int, backups: int) -> logging.Handler:
+    ## The file is only created when the first record is written
+    from logging.handlers import RotatingFileHandler
+    handler = RotatingFileHandler(fname, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+    handler.setFormatter(Formatter())
+    return handler
+
+def attach(handler: logging.Handler):
+    """ Makes `handler` the only destination of the log in this process.
+    """
+    for old in list(LOGGER.handlers):
+        LOGGER.removeHandler(old)
+        old.close()
+    if handler is not None:
+        LOGGER.addHandler(handler)
+
+def attach_queue(queue: mp.Queue):
+    """ Sends the records of this process to `queue` (called in each worker).
+    """
+    attach(QueueHandler(queue))
+
+def log(message: str, level: str='INFO', **fields):
+    """ log(message: str, level: str='INFO', request=None, status=None, latency=None, error=None)
+    """
+    level = logging.getLevelName(level) if type(level) is str else level
+    ## The record is built directly: looking up the caller's frame costs more than the rest
+    if LOGGER.isEnabledFor(level):
+        LOGGER.handle(LOGGER.makeRecord(LOGGER.name, level, '', 0, message, None, None, extra=fields))
+
+class LogListener:
+    """ Writes the records sent by every process to `fname`. Between `start`
+        and `stop`, the log of the main process goes through the queue too.
+    """
+
+    ## Rotation
+    MAX_BYTES = 8 << 20
+    BACKUPS = 3
+
+    ## Records kept in memory before a write (errors are written at once)
+    CAPACITY = 512
+
+    def __init__(self, fname: str, max_bytes: int=None, backups: int=None, capacity: int=None):
+        self.fname = fname
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        self.backups = self.BACKUPS if backups is None else backups
+        self.capacity = self.CAPACITY if capacity is None else capacity
+        self.queue = mp.Queue()
+        self.listener = None
+        self.handler = None
+
+    def __repr__(self):
+        return f"LogListener({self.fname!r})"
+
+    def start(self):
+        from logging.handlers import MemoryHandler, QueueListener
+        self.handler = MemoryHandler(
+            self.capacity,
+            flushLevel=logging.ERROR,
+            target=file_handler(self.fname, self.max_bytes, self.backups),
+        )
+        self.listener = QueueListener(self.queue, self.handler)
+        self.listener.start()
+        attach_queue(self.queue)
+
+    def stop(self):
+        """ Writes the records still queued and closes the file.
+        """
+        if self.listener is None:
+            return
+        attach(None)
+        self.listener.stop()
+        target = self.handler.target
+        self.handler.close() ## flushes, then lets go of the target
+        target.close()
+        self.listener = self.handler = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
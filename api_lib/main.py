@@ -1,21 +1,20 @@
-from urllib.request import urlopen, Request
 from urllib.parse import urlencode, urljoin
-from urllib.error import HTTPError, URLError
 from time import perf_counter as clock
-from time import sleep
 from functools import wraps
-import platform
 import warnings
+import marshal
 import hashlib
+import json
+import unicodedata
 import datetime
-import threading
-import sys
 import pickle
 import os
-import json
 import re
 import csv
 
+from . import decoder
+from .cities import normalize, COMBINING
+
 def kwget(kwargs: dict, default: dict):
     for key in kwargs:
         if key not in default:
@@ -40,6 +39,7 @@ def fetch_data(api_url: str, data: dict=None) -> (object):
     """ fetch_data(api_url: str, data: dict=None) -> (object)
         Returns an object decoded from a json object string.
     """
+    from urllib.error import HTTPError, URLError
     url = encode_url(api_url, data)
     try:
         return get_request_json(url)
@@ -52,6 +52,7 @@ def fetch_data_hash(api_url: str, data: dict=None) -> (object, bytes):
     """ fetch_data(api_url: str, data: dict=None) -> (object, bytes)
         Returns an object decoded from a json object string and its hash.
     """
+    from urllib.error import HTTPError, URLError
     url = encode_url(api_url, data)
     try:
         return get_request_hash(url)
@@ -63,27 +64,69 @@ def fetch_data_hash(api_url: str, data: dict=None) -> (object, bytes):
 def get_request_json(url: str, **kwargs) -> (object):
     ## Decode JSON into Python dict
     ans = request(url, **kwargs)[0]
-    return json.loads(ans.read())
+    return decoder.loads(ans.read())
 
 def get_request(url: str, **kwargs) -> str:
     ## Read answer from request
+    from urllib.request import urlopen
     return urlopen(url, **kwargs).read().decode('utf-8')
 
 def request(url: str, **kwargs):
     """ request(url: str, **kwargs) -> response, request
     """
+    from urllib.request import urlopen, Request
     req = Request(url, **kwargs)
     return urlopen(req), req
 
 def get_request_hash(url: str) -> (object, bytes):
     ## Read answer from API
+    from urllib.request import urlopen
     ans = urlopen(url).read()
     ## Decode JSON into Python dict
-    obj = json.loads(ans.decode('utf-8'))
+    obj = decoder.loads(ans)
     ## Get hash from `ans` bytes
     hsh = hashlib.sha256(ans).digest()
     return obj, hsh
 
+def conditional_get(url: str, etag: str=None, modified: str=None) -> (int, bytes, dict):
+    """ conditional_get(url: str, etag: str=None, modified: str=None) -> status, body, headers
+        GET with the validators of a previous answer; a 304 (unchanged) has no body.
+    """
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError, URLError
+    try:
+        with urlopen(Request(url, headers=conditional_headers(etag, modified))) as ans:
+            return ans.status, ans.read(), dict(ans.headers)
+    except HTTPError as error:
+        if error.code == 304:
+            return 304, None, dict(error.headers)
+        raise RuntimeError(f"{error.code}: Internal Server Error\n@ GET {url}")
+    except URLError:
+        raise RuntimeError("Desconectado da Internet. Operação Cancelada.")
+
+def conditional_headers(etag: str=None, modified: str=None) -> dict:
+    ## Request headers that turn a GET into a freshness check
+    headers = {}
+    if etag is not None:
+        headers['If-None-Match'] = etag
+    if modified is not None:
+        headers['If-Modified-Since'] = modified
+    return headers
+
+def validators(headers: dict) -> (str, str):
+    """ validators(headers: dict) -> etag, last_modified
+        Validators of a response (None when absent); header names are case-insensitive.
+    """
+    etag = modified = None
+    if headers:
+        for key, value in headers.items():
+            key = key.lower()
+            if key == 'etag':
+                etag = value
+            elif key == 'last-modified':
+                modified = value
+    return etag, modified
+
 def encode_url(url: str, data: dict=None) -> str:
     if data is None:
         return url
@@ -94,11 +137,18 @@ CITIES_URL = r'https://transparencia.registrocivil.org.br/api/cities'
 CITIES_CSV = r'data/cidades.csv'
 CITIES_HEADER = ['uf', 'name', 'id']
 CITIES_HASH = r'data/cidades.hash'
+CITIES_VALIDATORS = r'data/cidades.validators'
+CITIES_INDEX = r'data/cidades.index'
 
 ## Cities
-def fetch_cities() -> (list, bytes):
-    ans_data, ans_hash = fetch_data_hash(CITIES_URL)
-    return ans_data['cities'], ans_hash
+def fetch_cities(etag: str=None, modified: str=None) -> (list, bytes, tuple):
+    """ fetch_cities(etag: str=None, modified: str=None) -> cities, hash, (etag, modified)
+        `cities` and `hash` are None when the list did not change (304).
+    """
+    status, ans, headers = conditional_get(CITIES_URL, etag, modified)
+    if status == 304:
+        return None, None, validators(headers)
+    return decoder.loads(ans)['cities'], hashlib.sha256(ans).digest(), validators(headers)
 
 def dump_cities(ans_data: list, ans_hash: bytes) -> None:
     with open(CITIES_CSV, 'w') as file:
@@ -109,13 +159,54 @@ def dump_cities(ans_data: list, ans_hash: bytes) -> None:
         file.write(ans_hash)
 
 def load_cities() -> (dict, dict):
+    """ load_cities() -> states, id_table
+        Reads the city tables from the binary index (`CITIES_INDEX`), which is
+        rebuilt from `CITIES_CSV` whenever the csv or its hash change.
+    """
+    key = cities_key()
+    try:
+        with open(CITIES_INDEX, 'rb') as file:
+            index_key, tables = marshal.load(file)
+        if index_key == key:
+            return tables
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    tables = parse_cities()
+    dump_index(key, tables)
+    return tables
+
+def cities_key() -> tuple:
+    ## Identifies the current city list: its hash plus size and mtime of the csv
+    try:
+        with open(CITIES_HASH, 'rb') as file:
+            ans_hash = file.read()
+    except FileNotFoundError:
+        ans_hash = b''
+    stat = os.stat(CITIES_CSV)
+    return (ans_hash, stat.st_size, stat.st_mtime_ns)
+
+def dump_index(key: tuple, tables: tuple) -> None:
+    ## Written aside and then renamed, so readers never see half an index
+    temp = f'{CITIES_INDEX}.{os.getpid()}'
+    try:
+        with open(temp, 'wb') as file:
+            marshal.dump((key, tables), file)
+        os.replace(temp, CITIES_INDEX)
+    except OSError:
+        ## Read-only installs just parse the csv every time
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+def parse_cities() -> (dict, dict):
     states = {}
     id_table = {}
     with open(CITIES_CSV, encoding='utf-8') as file:
         reader = csv.reader(file)
         for row in reader:
             state, city_name, city_id = row
-            ascii_city_name = ascii_decode(city_name).upper()
+            ascii_city_name = normalize(city_name)
             if state in states:
                 states[state].append(ascii_city_name)
             else:
@@ -123,17 +214,56 @@ def load_cities() -> (dict, dict):
             id_table[(state, ascii_city_name)] = city_id
     return states, id_table
 
-def update_cities():
-    ans_data, ans_hash = fetch_cities()
+def load_validators() -> (str, str):
+    ## Validators of the last city list downloaded, if any
     try:
-        with open(CITIES_HASH, 'rb') as file:
-            if ans_hash != file.read():
-                raise FileNotFoundError
-            else:
-                print('Sem atualizações disponíveis.')
-    except FileNotFoundError:
+        with open(CITIES_VALIDATORS, encoding='utf-8') as file:
+            return tuple(json.load(file))
+    except (FileNotFoundError, ValueError, TypeError):
+        return None, None
+
+def dump_validators(etag: str, modified: str) -> None:
+    with open(CITIES_VALIDATORS, 'w', encoding='utf-8') as file:
+        json.dump([etag, modified], file)
+
+def update_cities():
+    """ Downloads the city list only if it changed: the server is asked with the
+        validators of the last download (ETag, Last-Modified); when it does not
+        support them, the hash of the body is compared with `CITIES_HASH`.
+    """
+    etag, modified = load_validators() if os.path.exists(CITIES_HASH) else (None, None)
+    ans_data, ans_hash, (new_etag, new_modified) = fetch_cities(etag, modified)
+    if ans_data is not None:
+        try:
+            with open(CITIES_HASH, 'rb') as file:
+                changed = ans_hash != file.read()
+        except FileNotFoundError:
+            changed = True
+    else:
+        changed = False
+    if (new_etag, new_modified) != (None, None) and (new_etag, new_modified) != (etag, modified):
+        dump_validators(new_etag or etag, new_modified or modified)
+    if changed:
         dump_cities(ans_data, ans_hash)
         warnings.warn('Lista de cidades atualizada.', stacklevel=2)
+    else:
+        print('Sem atualizações disponíveis.')
+
+class lazy_attribute:
+    """ Class attribute computed by `load()` on first access, then stored on the class.
+    """
+
+    def __init__(self, load):
+        self.load = load
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        value = self.load()
+        setattr(owner, self.name, value)
+        return value
 
 def get_date(date: object):
     if type(date) is datetime.date:
@@ -143,9 +273,13 @@ def get_date(date: object):
     else:
         raise TypeError(f'Especificação de data inválida: `{date}`')
 
+CITY_REGEX = re.compile(r"^([^\W\d_][\w '/%-]*)-([A-Z]{2})$")
+
 def get_city(city: object):
-    if type(city) is str and re.match(r'^[a-zA-zà-ÿÀ-ÿ ]+\-[A-Z]{2}$', city):
-        return city.split('-')
+    ## 'Nome da Cidade-UF' -> [name, state]; names may contain hyphens and apostrophes
+    match = CITY_REGEX.match(city) if type(city) is str else None
+    if match is not None:
+        return list(match.groups())
     else:
         raise ValueError(f'Especificação de cidade inválida: {city}.\nO formato correto é `Nome da Cidade-UF`')
 
@@ -159,27 +293,15 @@ def time(callback):
         return x
     return new_callback
 
-ASCII_DECODE = {
-    'à': 'a', 'á': 'a', 'À': 'A', 'Á': 'A', 'ã': 'a', 'Ã': 'A', 'â': 'A', 'Â': 'A',
-    'é': 'e', 'É': 'E', 'ê': 'e', 'Ê': 'E',
-    'í': 'i', 'Í': 'I',
-    'ó': 'o', 'Ó': 'O', 'õ': 'o', 'Õ': 'O', 'ô': 'o', 'Ô': 'O',
-    'ú': 'u', 'Ú': 'U',
-    'ç': 'c', 'Ç': 'C',
-}
-
-ASCII_PATTERN = '|'.join(re.escape(key) for key in ASCII_DECODE)
-
-ASCII_REGEX = re.compile(ASCII_PATTERN, flags=re.IGNORECASE)
-
 def ascii_decode(s: str) -> str:
-    return ASCII_REGEX.sub(lambda match: ASCII_DECODE.get(match.group(0)), s)
+    ## Strips accents, keeping the case
+    return s if s.isascii() else unicodedata.normalize('NFKD', s).translate(COMBINING)
 
-def log(mode='w'):
+def log(mode='a'):
     def decor(callback):
         @wraps(callback)
         def new_callback(self, *args, **kwargs):
-            if self.log_file.closed:
+            if self.log_file is None or self.log_file.closed:
                 with open(self.LOG_FNAME, mode) as self.log_file:
                     return callback(self, *args, **kwargs)
             else:
@@ -0,0 +1,139 @@
+from urllib.parse import urlsplit
+import threading
+import queue
+import functools
+import zlib
+
+from .main import lazy_attribute
+
+@functools.lru_cache(maxsize=None)
+def load_brotli():
+    """ The `brotli` module, imported with the first connection. None if it is not installed.
+    """
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+class ConnectionPool:
+    """ Pool of persistent HTTP(S) connections shared by many threads.
+        Connections are kept alive between requests and responses are
+        decompressed (gzip, deflate, br) as they are read.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    ACCEPT_ENCODING = lazy_attribute(lambda: 'gzip, br' if load_brotli() is not None else 'gzip')
+
+    def __init__(self, size: int=16, timeout: float=30.0):
+        ## Maximum number of idle connections kept per host
+        self.size = size
+
+        ## Socket timeout
+        self.timeout = timeout
+
+        ## Idle connections, per (scheme, host)
+        self.__idle = {}
+        self.__lock = threading.Lock()
+
+    def __repr__(self):
+        return f"ConnectionPool(size={self.size!r}, timeout={self.timeout!r})"
+
+    def __getstate__(self):
+        ## Connections are never shared between processes
+        return {'size': self.size, 'timeout': self.timeout}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def _idle(self, key: tuple) -> queue.LifoQueue:
+        with self.__lock:
+            if key not in self.__idle:
+                self.__idle[key] = queue.LifoQueue(self.size)
+            return self.__idle[key]
+
+    def connect(self, scheme: str, host: str):
+        from http.client import HTTPSConnection, HTTPConnection
+        if scheme == 'https':
+            return HTTPSConnection(host, timeout=self.timeout)
+        else:
+            return HTTPConnection(host, timeout=self.timeout)
+
+    def acquire(self, scheme: str, host: str) -> (object, bool):
+        """ acquire(scheme, host) -> connection, reused
+        """
+        try:
+            return self._idle((scheme, host)).get_nowait(), True
+        except queue.Empty:
+            return self.connect(scheme, host), False
+
+    def release(self, scheme: str, host: str, conn):
+        try:
+            self._idle((scheme, host)).put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        with self.__lock:
+            idle, self.__idle = self.__idle, {}
+        for connections in idle.values():
+            while not connections.empty():
+                connections.get_nowait().close()
+
+    @staticmethod
+    def decoder(encoding: str):
+        if encoding == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            return zlib.decompressobj()
+        elif encoding == 'br' and load_brotli() is not None:
+            return load_brotli().Decompressor()
+        elif encoding in ('', 'identity'):
+            return None
+        else:
+            raise ValueError(f'Unsupported Content-Encoding: {encoding}')
+
+    def read(self, response) -> bytes:
+        """ Reads the response body, decompressing each chunk as it arrives.
+        """
+        decoder = self.decoder(response.getheader('Content-Encoding', '').strip().lower())
+        chunks = []
+        while True:
+            chunk = response.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk if decoder is None else decoder.decompress(chunk))
+        if decoder is not None:
+            chunks.append(decoder.flush() if hasattr(decoder, 'flush') else decoder.finish())
+        return b''.join(chunks)
+
+    def get(self, url: str, headers: dict=None) -> (int, dict, bytes):
+        """ get(url: str, headers: dict=None) -> status, headers, body
+        """
+        parts = urlsplit(url)
+        path = f"{parts.path or '/'}?{parts.query}" if parts.query else (parts.path or '/')
+        headers = {**({} if headers is None else headers), 'Accept-Encoding': self.ACCEPT_ENCODING}
+        from http.client import HTTPException
+
+        while True:
+            conn, reused = self.acquire(parts.scheme, parts.netloc)
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = self.read(response)
+            except (HTTPException, ConnectionError) as error:
+                conn.close()
+                ## Server closed an idle connection: try again with a new one
+                if reused: continue
+                raise error
+            except BaseException:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self.release(parts.scheme, parts.netloc, conn)
+
+            return response.status, dict(response.getheaders()), body
@@ -1,18 +1,24 @@
 from time import perf_counter as clock
-from time import sleep
 import multiprocessing as mp
-import _thread as thread
+import threading
 
 class Progress:
+    """ Progress of a crawl shared by every worker process.
+
+        Each worker owns one slot of a shared array (see `claim`) and is the
+        only one writing to it, so counting a step takes no lock. The display
+        thread sums the slots once per tick and renders the line from that
+        single snapshot.
+    """
 
     __slots__ = (
-        'text', '__lapse', '__total', '__lock', '__done', '_done',
-        '__start_time', '__last_length', '__finished',
+        'text', '__lapse', '__total', '__slot', '__count', '__done', '__limit',
+        '__start_time', '__last_length', '__finished', '__stop', '__thread',
     )
 
     STEPS = 20
 
-    def __init__(self, total: int, lapse: float=None, text: str='Progresso:'):
+    def __init__(self, total: int, lapse: float=None, text: str='Progresso:', workers: int=1):
         ## Some text
         self.text = text
 
@@ -22,9 +28,11 @@ class Progress:
         ## Total steps
         self.__total = total
 
-        ## Lock for progress track
-        self.__lock = mp.Lock()
-        self.__done = mp.Value('i', 0)
+        ## Steps done and concurrency limit of each worker (slot 0 until `claim`)
+        self.__slot = 0
+        self.__count = 0
+        self.__done = mp.RawArray('q', max(workers, 1))
+        self.__limit = mp.RawArray('q', max(workers, 1))
 
         self.__start_time = clock()
 
@@ -33,12 +41,44 @@ class Progress:
 
         ## Finished
         self.__finished = False
-        
+
+        ## Display thread
+        self.__stop = None
+        self.__thread = None
+
         print(self, end='\r')
 
-    @property
-    def lock(self):
-        return self.__lock
+    def __getstate__(self) -> dict:
+        ## The display thread stays in the process that started it
+        return {
+            'text': self.text,
+            'lapse': self.__lapse,
+            'total': self.__total,
+            'done': self.__done,
+            'limit': self.__limit,
+            'start_time': self.__start_time,
+        }
+
+    def __setstate__(self, state: dict):
+        self.text = state['text']
+        self.__lapse = state['lapse']
+        self.__total = state['total']
+        self.__slot = 0
+        self.__count = 0
+        self.__done = state['done']
+        self.__limit = state['limit']
+        self.__start_time = state['start_time']
+        self.__last_length = 0
+        self.__finished = False
+        self.__stop = None
+        self.__thread = None
+
+    def claim(self, slot: int):
+        """ Makes this process the owner of `slot` (one per worker, starting at 0).
+            Steps and limits of this process are written there, and only there.
+        """
+        self.__slot = slot
+        self.__count = self.__done[slot]
 
     @property
     def total(self):
@@ -49,12 +89,22 @@ class Progress:
 
     @property
     def done(self):
-        with self.lock: return self.__done.value
+        return sum(self.__done)
+
+    @property
+    def limit(self):
+        return sum(self.__limit)
+
+    def adjust_limit(self, delta: int):
+        """ Adds `delta` to the displayed concurrency limit (of this worker's slot).
+        """
+        if delta:
+            self.__limit[self.__slot] += delta
 
     @property
     def start_time(self):
         return self.__start_time
-    
+
     @property
     def total_time(self):
         return clock() - self.start_time
@@ -64,70 +114,77 @@ class Progress:
         return self.__finished or (self.done >= self.total)
 
     def __next__(self):
-        if not self.finished:
-            with self.lock: self.__done.value += 1
-        else:
-            raise StopIteration
+        ## Only the owner of the slot writes it: no lock, no read of shared memory
+        self.__count += 1
+        self.__done[self.__slot] = self.__count
 
     def display(self):
         self.start()
-        while not self.finished:
-            self.update()
-            sleep(self.__lapse)
-        else:
-            self.update()
-            print(f'Time elapsed: {self.total_time:.1f}s')
+        done = self.done
+        while not (self.__stop.is_set() or done >= self.total):
+            self.update(done)
+            self.__stop.wait(self.__lapse)
+            done = self.done
+        self.update(done, end='\n')
+        print(f'Time elapsed: {self.total_time:.1f}s')
 
     def finish(self):
+        """ Stops the display and waits for its final line (with the final counts).
+        """
         self.__finished = True
-            
-    def track(self, lapse:float=None) -> int:
-        if lapse is not None: 
+        if self.__thread is not None:
+            self.__stop.set()
+            self.__thread.join()
+            self.__thread = None
+
+    def track(self, lapse: float=None) -> threading.Thread:
+        if lapse is not None:
             self.__lapse = lapse
-        return thread.start_new(self.display, ())
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.display, daemon=True)
+        self.__thread.start()
+        return self.__thread
 
-    @property
-    def end(self):
-        return '\n' if self.finished else '\r'
+    def update(self, done: int=None, end: str='\r'):
+        line = self.line(self.done if done is None else done, self.limit, self.total_time)
+        print(line, ' ' * (self.__last_length - len(line)), end=end)
+        self.__last_length = len(line)
 
-    def update(self):
-        print(self, self.padding, end=self.end)
-        self.__last_length = self.length
-        
     def __str__(self):
         """ output string;
         """
-        return f'{self.text} {self.bar} {self.done}/{self.total} {100 * self.ratio:2.2f}% eta: {self.eta} rate: {self.rate:.2f}/s'
-
-    @property
-    def padding(self):
-        """ padding needed to erase previous output;
-        """
-        return " " * (self.__last_length - self.length)
+        return self.line(self.done, self.limit, self.total_time)
 
-    @property
-    def length(self):
-        """ output string lenght;
+    def line(self, done: int, limit: int, elapsed: float) -> str:
+        """ Output string for one snapshot of the counters.
         """
-        return len(str(self))
+        ratio = done / self.total if self.total else 1.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = self.format_time(elapsed / done * (self.total - done)) if done else '?'
+        text = f'{self.text} {self.bar(ratio)} {done}/{self.total} {100 * ratio:2.2f}% eta: {eta} rate: {rate:.2f}/s'
+        return f'{text} limit: {limit}' if limit else text
 
     @property
     def ratio(self) -> float:
         """ progress ratio; value in [0, 1]
         """
-        return self.done / self.total
+        return self.done / self.total if self.total else 1.0
 
     @property
     def rate(self):
         """ steps per second;
         """
         return self.done / self.total_time
-    
+
     @property
     def eta(self) -> str:
-        if not self.done:
+        done = self.done
+        if not done:
             return "?"
-        s = (self.total_time / self.done) * (self.total - self.done)
+        return self.format_time((self.total_time / done) * (self.total - done))
+
+    @staticmethod
+    def format_time(s: float) -> str:
         if s >= 60:
             m, s = divmod(s, 60)
             if m >= 60:
@@ -142,11 +199,11 @@ class Progress:
         else:
             return f"{int(s):d}s"
 
-    @property
-    def bar(self) -> str:
-        if self.ratio == 0.0:
-            return f"[{' ' * self.STEPS}]"
-        elif self.ratio < 1:
-            return f"[{int(self.ratio * self.STEPS) * '='}>{int((1 - self.ratio) * self.STEPS) * ' '}]"
+    @classmethod
+    def bar(cls, ratio: float) -> str:
+        if ratio == 0.0:
+            return f"[{' ' * cls.STEPS}]"
+        elif ratio < 1:
+            return f"[{int(ratio * cls.STEPS) * '='}>{int((1 - ratio) * cls.STEPS) * ' '}]"
         else:
-            return f"[{'=' * self.STEPS}]"
\ No newline at end of file
+            return f"[{'=' * cls.STEPS}]"
@@ -0,0 +1,151 @@
+from time import time as now
+from time import sleep
+import multiprocessing as mp
+import queue
+
+class Scheduler:
+    """ Hands out small chunks of `range(total)` to workers on demand.
+
+        Workers `claim` chunks as they become idle, so no worker is left with
+        a fixed slice full of slow indices. Failed indices are `release`d back
+        into the pool and claimed again (by any worker) before fresh ones, after
+        a backoff that doubles with each attempt; an index that fails
+        `max_attempts` times is given up. Indices held by a worker that died
+        are written off with `abandon`. The crawl is over once every index was
+        claimed and marked `done` (or given up).
+    """
+
+    __slots__ = (
+        'total', 'chunk_size', 'lapse', 'max_attempts', 'backoff', 'max_backoff', '__slot',
+        '__lock', '__next', '__pending', '__held', '__attempts', '__failed', '__abandoned', '__retry',
+    )
+
+    ## Attempts per index, and delay before an index is handed out again (doubled each attempt)
+    MAX_ATTEMPTS = 8
+    BACKOFF = 0.5
+    MAX_BACKOFF = 30.0
+
+    def __init__(self, total: int, chunk_size: int=64, lapse: float=0.1, workers: int=1, max_attempts: int=None, backoff: float=None):
+        ## Index space
+        self.total = total
+
+        ## Maximum number of indices handed out per claim
+        self.chunk_size = chunk_size
+
+        ## Polling interval while other workers hold the remaining indices
+        self.lapse = lapse
+
+        ## Retries
+        self.max_attempts = self.MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.backoff = self.BACKOFF if backoff is None else backoff
+        self.max_backoff = self.MAX_BACKOFF
+
+        ## Worker slot of this process (see `register`)
+        self.__slot = 0
+
+        ## Shared state
+        self.__lock = mp.Lock()
+        self.__next = mp.RawValue('q', 0) ## next fresh index
+        self.__pending = mp.RawValue('q', 0) ## claimed (or released) but not done
+        self.__held = mp.RawArray('q', max(workers, 1)) ## claimed and not done, per worker
+        self.__attempts = mp.RawArray('B', max(total, 1)) ## failures per index
+        self.__failed = mp.RawValue('q', 0) ## given up after `max_attempts`
+        self.__abandoned = mp.RawValue('q', 0) ## held by workers that died
+        self.__retry = mp.Queue()
+
+    def __repr__(self):
+        return f"Scheduler(total={self.total!r}, chunk_size={self.chunk_size!r})"
+
+    def register(self, slot: int):
+        """ Makes this process worker `slot` (one per worker, starting at 0).
+        """
+        self.__slot = slot
+
+    @property
+    def finished(self) -> bool:
+        with self.__lock:
+            return self.__next.value >= self.total and self.__pending.value == 0
+
+    @property
+    def failed(self) -> int:
+        return self.__failed.value
+
+    @property
+    def abandoned(self) -> int:
+        return self.__abandoned.value
+
+    def claim(self, n: int=None):
+        """ claim(n: int=None) -> range | list | None
+            Claims up to `n` (default `chunk_size`) indices. Returns None if
+            there is nothing to hand out right now.
+        """
+        n = self.chunk_size if n is None else min(n, self.chunk_size)
+        try:
+            ready, indices = self.__retry.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            if ready <= now():
+                with self.__lock:
+                    self.__held[self.__slot] += len(indices)
+                return indices
+            ## Still backing off: fresh indices go first
+            self.__retry.put((ready, indices))
+        with self.__lock:
+            start = self.__next.value
+            if start >= self.total:
+                return None
+            stop = min(start + n, self.total)
+            self.__next.value = stop
+            self.__pending.value += stop - start
+            self.__held[self.__slot] += stop - start
+        return range(start, stop)
+
+    def release(self, indices: list) -> list:
+        """ release(indices: list) -> list
+            Puts failed indices back into the pool. Returns the ones given up
+            (failed `max_attempts` times), which count as done from now on.
+        """
+        retry = []
+        failed = []
+        with self.__lock:
+            for i in indices:
+                attempts = min(self.__attempts[i] + 1, 255)
+                self.__attempts[i] = attempts
+                (failed if attempts >= self.max_attempts else retry).append(i)
+            self.__held[self.__slot] -= len(retry) + len(failed)
+            self.__pending.value -= len(failed)
+            self.__failed.value += len(failed)
+        for k in range(0, len(retry), self.chunk_size):
+            chunk = retry[k:k + self.chunk_size]
+            delay = min(self.backoff * 2 ** (max(self.__attempts[i] for i in chunk) - 1), self.max_backoff)
+            self.__retry.put((now() + delay, chunk))
+        return failed
+
+    def done(self, n: int=1):
+        """ Marks `n` claimed indices as completed.
+        """
+        if n:
+            with self.__lock:
+                self.__pending.value -= n
+                self.__held[self.__slot] -= n
+
+    def abandon(self, slot: int) -> int:
+        """ Writes off the indices held by worker `slot`, once its process is gone,
+            so that the others do not wait for them. Returns how many there were.
+        """
+        with self.__lock:
+            held, self.__held[slot] = self.__held[slot], 0
+            self.__pending.value -= held
+            self.__abandoned.value += held
+        return held
+
+    def wait(self) -> bool:
+        """ wait() -> bool
+            Sleeps while other workers hold the remaining indices (or retries are
+            backing off). Returns False once the crawl is over.
+        """
+        if self.finished:
+            return False
+        sleep(self.lapse)
+        return True
@@ -1,10 +1,14 @@
 from functools import wraps
-import platform
+import sys
+import os
+
+## Same names as `platform.system()`, without importing `platform`
+SYSTEM = 'Windows' if sys.platform == 'win32' else os.uname().sysname
 
 class MetaStandbyLock(type):
     """
     """
-    SYSTEM = platform.system()
+    SYSTEM = SYSTEM
 
     def __new__(cls, name: str, bases: tuple, attrs: dict) -> type:
         if not ('inhibit' in attrs and 'release' in attrs):
@@ -30,14 +34,14 @@ class StandbyLock(metaclass=MetaStandbyLock):
     @classmethod
     def inhibit(cls):
         if cls._subclass is None:
-            raise OSError(f"There is no 'StandbyLock' implementation for OS '{platform.system()}'.")
+            raise OSError(f"There is no 'StandbyLock' implementation for OS '{SYSTEM}'.")
         else:
             return cls._subclass.inhibit()
 
     @classmethod
     def release(cls):
         if cls._subclass is None:
-            raise OSError(f"There is no 'StandbyLock' implementation for OS '{platform.system()}'.")
+            raise OSError(f"There is no 'StandbyLock' implementation for OS '{SYSTEM}'.")
         else:
             return cls._subclass.release()
     
@@ -0,0 +1,68 @@
+import multiprocessing as mp
+import json
+import os
+
+class Stats:
+    """ Latency and size of the requests sent in a crawl, shared by all processes.
+        Totals are kept per chart in a small JSON history, used to plan later crawls.
+    """
+
+    __slots__ = ('__lock', '__requests', '__latency', '__bytes')
+
+    def __init__(self):
+        self.__lock = mp.Lock()
+        self.__requests = mp.RawValue('q', 0)
+        self.__latency = mp.RawValue('d', 0.0)
+        self.__bytes = mp.RawValue('q', 0)
+
+    def __repr__(self):
+        return f"Stats(requests={self.requests}, latency={self.latency}, bytes={self.bytes})"
+
+    def record(self, latency: float, size: int):
+        """ Registers a request answered by the network in `latency` seconds with `size` bytes.
+        """
+        with self.__lock:
+            self.__requests.value += 1
+            self.__latency.value += latency
+            self.__bytes.value += size
+
+    @property
+    def requests(self) -> int:
+        return self.__requests.value
+
+    @property
+    def latency(self) -> float:
+        """ Mean latency, in seconds.
+        """
+        return self.__latency.value / self.requests if self.requests else None
+
+    @property
+    def bytes(self) -> float:
+        """ Mean response size, in bytes.
+        """
+        return self.__bytes.value / self.requests if self.requests else None
+
+    @staticmethod
+    def load(fname: str) -> dict:
+        """ load(fname: str) -> {chart: {'requests': int, 'latency': float, 'bytes': int}}
+        """
+        try:
+            with open(fname) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self, fname: str, chart: str):
+        """ Adds this crawl's totals to the history in `fname`.
+        """
+        if not self.requests:
+            return
+        history = self.load(fname)
+        totals = history.setdefault(chart, {'requests': 0, 'latency': 0.0, 'bytes': 0})
+        with self.__lock:
+            totals['requests'] += self.__requests.value
+            totals['latency'] += self.__latency.value
+            totals['bytes'] += self.__bytes.value
+        with open(f'{fname}.tmp', 'w') as file:
+            json.dump(history, file, indent=4)
+        os.replace(f'{fname}.tmp', fname)
@@ -10,6 +10,7 @@ import numpy as np
 ## Local
 from api import API
 import api_lib
+import api_io
 
 class Plotter:
 
@@ -117,10 +118,10 @@ class Plotter:
             'cumulative': False,
         })
 
-        if not fname.endswith('.csv'):
+        if not fname.endswith(('.csv', '.csv.gz')):
             fname = f'{fname}.csv'
 
-        with open(fname, 'r') as file:
+        with api_io.open_csv(fname) as file:
             reader = csv.reader(file)
             header = next(reader)
             table = {header[i] : i for i in range(len(header))}
@@ -0,0 +1,75 @@
+""" Startup cost: time of `import api` in a fresh interpreter.
+
+    Each sample runs in its own process, after one warm-up run that writes
+    the bytecode and the city index (`data/cidades.index`). With `--cold`,
+    the city index is removed before every sample. `--profile` prints the
+    slowest modules reported by `python -X importtime`.
+
+    Exits with status 1 when the median is above `--budget` milliseconds.
+
+    $ python benchmarks/import_time.py [--number 10] [--budget 100] [--cold] [--profile]
+"""
+import subprocess
+import statistics
+import argparse
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+
+from api_lib import CITIES_INDEX
+
+SAMPLE = "import time; t = time.perf_counter(); import api; print(1e3 * (time.perf_counter() - t))"
+
+def environ() -> dict:
+    env = dict(os.environ)
+    ## Installs keep their bytecode: measure with it
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+def sample(*options: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *options, '-c', SAMPLE], cwd=ROOT, env=environ(), capture_output=True, text=True, check=True)
+
+def drop_index():
+    try:
+        os.remove(os.path.join(ROOT, CITIES_INDEX))
+    except FileNotFoundError:
+        pass
+
+def profile(top: int=15):
+    """ Slowest modules (cumulative microseconds) from `-X importtime`.
+    """
+    modules = []
+    for line in sample('-X', 'importtime').stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative), name.rstrip()))
+    for cumulative, name in sorted(modules, reverse=True)[:top]:
+        print(f'{cumulative / 1e3:8.1f}ms {name}')
+
+def main(number: int=10, budget: float=100.0, cold: bool=False, top: int=0) -> int:
+    sample()
+    times = []
+    for _ in range(number):
+        if cold: drop_index()
+        times.append(float(sample().stdout))
+    median = statistics.median(times)
+    print(f"import api: median {median:.1f}ms, min {min(times):.1f}ms, max {max(times):.1f}ms ({number} runs{', cold' if cold else ''})")
+    if top:
+        profile(top)
+    if median > budget:
+        print(f'Acima do limite de {budget:.0f}ms.')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tempo de inicialização (`import api`)')
+    parser.add_argument('--number', type=int, default=10, help='número de execuções')
+    parser.add_argument('--budget', type=float, default=100.0, help='limite para a mediana, em ms')
+    parser.add_argument('--cold', action='store_true', help='remove o índice de cidades antes de cada execução')
+    parser.add_argument('--profile', type=int, nargs='?', const=15, default=0, help='mostra os N módulos mais lentos')
+    args = parser.parse_args()
+    sys.exit(main(args.number, args.budget, args.cold, args.profile))
@@ -0,0 +1,79 @@
+""" Microbenchmark of the JSON decoding of API responses, per chart type.
+
+    Compares the old path (`json.loads(raw.decode('utf-8'))`) with every
+    backend available in `api_lib.decoder`. Payloads are read from a response
+    cache (`--cache cache/nome.db`) when given, otherwise synthetic payloads
+    with the shape of each chart are used.
+
+    $ python benchmarks/json_decode.py [--cache cache/nome.db] [--number 2000]
+"""
+import argparse
+import datetime
+import sqlite3
+import timeit
+import json
+import zlib
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_lib
+from api_constants import CAUSES
+
+AGES = ('< 9', '10 - 19', '20 - 29', '30 - 39', '40 - 49', '50 - 59', '60 - 69', '70 - 79', '80 - 89', '90 - 99', '> 100', 'N/I')
+
+def synthetic() -> dict:
+    """ One payload per chart, shaped like the API answers.
+    """
+    ages = {age: {year: {cause: 17 * i + len(cause) for i, cause in enumerate(CAUSES)} for year in ('2019', '2020')} for age in AGES}
+    days = {}
+    date = datetime.date(2020, 3, 1)
+    for i in range(31):
+        days[(date + datetime.timedelta(days=i)).isoformat()] = {cause: [{'total': i + len(cause)}] for cause in CAUSES}
+    return {
+        'chart2': [json.dumps({'chart': ages}).encode('utf-8')],
+        'chart3': [json.dumps({'chart': ages}).encode('utf-8')],
+        'chart5': [json.dumps({'chart': days}).encode('utf-8')],
+    }
+
+def recorded(fname: str, limit: int=200) -> dict:
+    """ Up to `limit` cached bodies per chart, from a `ResponseCache` file.
+    """
+    payloads = {}
+    conn = sqlite3.connect(f'file:{fname}?mode=ro', uri=True)
+    try:
+        for chart in ('chart2', 'chart3', 'chart5'):
+            rows = conn.execute('SELECT body FROM responses WHERE url LIKE ? LIMIT ?', (f'%chart={chart}%', limit)).fetchall()
+            if rows:
+                payloads[chart] = [zlib.decompress(body) for body, in rows]
+    finally:
+        conn.close()
+    return payloads
+
+def bench(payloads: list, loads, number: int) -> float:
+    """ Mean time to decode one payload, in microseconds.
+    """
+    def run():
+        for raw in payloads:
+            loads(raw)
+    return 1e6 * min(timeit.repeat(run, number=number, repeat=3)) / (number * len(payloads))
+
+def main(cache: str=None, number: int=2000):
+    payloads = synthetic() if cache is None else recorded(cache)
+    decoders = {'json (str)': lambda raw: json.loads(raw.decode('utf-8')), **api_lib.JSON_BACKENDS}
+
+    print(f"{'chart':<8} {'bytes':>8} " + ' '.join(f'{name:>14}' for name in decoders))
+    for chart, raws in payloads.items():
+        size = sum(map(len, raws)) // len(raws)
+        times = {name: bench(raws, loads, number) for name, loads in decoders.items()}
+        base = times['json (str)']
+        cells = [f'{t:8.1f}us x{base / t:4.2f}' for t in times.values()]
+        print(f'{chart:<8} {size:>8} ' + ' '.join(f'{cell:>14}' for cell in cells))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decodificação JSON por tipo de gráfico')
+    parser.add_argument('--cache', type=str, default=None, help='cache de respostas (cache/nome.db)')
+    parser.add_argument('--number', type=int, default=2000, help='repetições por medida')
+    args = parser.parse_args()
+    main(args.cache, args.number)
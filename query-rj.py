@@ -2,9 +2,9 @@ import api
 import os
 import argparse
 
-def main(date=all, city=all, state=all, gender=all, age=True, places=all, block_size=1024, threads=os.cpu_count()):
+def main(date=all, city=all, state=all, gender=all, age=True, places=all, block_size=1024, threads=os.cpu_count(), rate=None, burst=None, refetch=api.BACKFILL_DAYS, resume=False, dry_run=False):
     ## Define os parâmetros da busca
-    api.API(
+    query = api.API(
         date=date, ## busca para todas as datas de 2019-01-01 até hoje
         city=city,## busca para todas as cidades no estados especificados abaixo
         state='RJ', ## busca para todos os estados
@@ -13,15 +13,30 @@ def main(date=all, city=all, state=all, gender=all, age=True, places=all, block_
         places=places, ## busca dados para cada local possível
         block_size=block_size,
         threads=threads,
+        rate=rate, ## requisições por segundo, somando todos os processos
+        burst=burst,
+        refetch=refetch, ## dias buscados novamente com --incremental
+        resume=resume, ## retoma a busca interrompida (ver <output>.ckpt)
         output='resultados-RJ'
-    ).get() ## coleta os dados e salva em csv
+    )
+
+    if dry_run:
+        query.plan() ## apenas estima o custo da busca
+    else:
+        query.get() ## coleta os dados e salva em csv
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='API de busca para dados dos cartórios.')
     parser.add_argument('--gender', type=str, dest='gender', help='gender options', default=all, choices=['M', 'F'])
     parser.add_argument('--threads', type=int, dest='threads', help='number of threads', default=os.cpu_count())
     parser.add_argument('--block-size', type=int, dest='block_size', default=1024)
+    parser.add_argument('--rate', type=float, dest='rate', help='global requests per second (all processes)', default=None)
+    parser.add_argument('--burst', type=int, dest='burst', help='token bucket size for --rate', default=None)
+    parser.add_argument('--incremental', action='store_const', dest='date', const='incremental', default=all, help='only fetch dates missing from the previous output')
+    parser.add_argument('--resume', action='store_true', dest='resume', help='skip the requests completed by an interrupted run')
+    parser.add_argument('--dry-run', action='store_true', dest='dry_run', help='print the query plan and exit')
+    parser.add_argument('--refetch', type=int, dest='refetch', help='days re-fetched before the latest stored date (--incremental)', default=api.BACKFILL_DAYS)
 
     args = parser.parse_args()
 
-    main(gender=args.gender, threads=args.threads, block_size=args.block_size)
\ No newline at end of file
+    main(date=args.date, gender=args.gender, threads=args.threads, block_size=args.block_size, rate=args.rate, burst=args.burst, refetch=args.refetch, resume=args.resume, dry_run=args.dry_run)
\ No newline at end of file